@@ -1,16 +1,199 @@
+import re
+import time
+import atexit
+import queue
+import random
 import sqlite3
+import logging
 import functools
-from datetime import datetime
+import threading
+from logging.handlers import QueueHandler, QueueListener
 
 #### decorator to log SQL queries
 
-def log_queries(func):
+logger = logging.getLogger('queries')
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+def fingerprint(query):
+    """Normalize a query so calls that only differ in literals group together"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", query)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?+)", sql)
+    return re.sub(r"\s+", " ", sql).strip().lower()
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as exposed by Prometheus"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.sum += value
+            self.count += 1
+
+
+class MetricsRegistry:
+    """In-process registry of labelled histograms"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, buckets, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._metrics:
+                self._metrics[key] = (help_text, Histogram(buckets))
+            return self._metrics[key][1]
+
+    def to_prometheus(self):
+        """Render every histogram in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for (name, labels), (help_text, histogram) in metrics:
+            if name not in described:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                described.add(name)
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+_listener = None
+_queue_handler = None
+_listener_lock = threading.Lock()
+
+def start_query_logging(*handlers):
+    """
+    Send 'queries' records through a queue so logging never blocks the
+    caller; a background listener hands them to handlers (stderr by
+    default). The queue handler is added next to any handlers already
+    configured, and nothing is logged this way until this is called.
+    Returns the listener.
+    """
+    global _listener, _queue_handler
+    with _listener_lock:
+        _stop()
+        log_queue = queue.SimpleQueue()
+        _queue_handler = QueueHandler(log_queue)
+        logger.addHandler(_queue_handler)
+        if logger.level == logging.NOTSET:
+            logger.setLevel(logging.INFO)
+        _listener = QueueListener(log_queue, *(handlers or (logging.StreamHandler(),)))
+        _listener.start()
+        return _listener
+
+@atexit.register
+def stop_query_logging():
+    """Flush queued records, stop the listener and remove its queue handler"""
+    with _listener_lock:
+        _stop()
+
+def _stop():
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logger.removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _query_text(args, kwargs):
+    if 'query' in kwargs:
+        return kwargs['query']
+    return next((arg for arg in args if isinstance(arg, str)), '')
+
+def log_queries(func=None, *, sample_rate=1.0, slow_threshold=None, metrics=None):
+    """
+    Instruments database queries: wall time, rows returned and query
+    fingerprint go to a histogram registry, and a record is logged to the
+    'queries' logger (queued once start_query_logging() is called).
+    Only sample_rate of the calls are measured (an unsampled call costs
+    one random() call); with sample_rate=0 func is returned unwrapped.
+    Queries slower than slow_threshold seconds, and failed queries, are
+    logged as warnings; durations are labelled status="ok" or "error".
+    """
+    if func is None:
+        return functools.partial(log_queries, sample_rate=sample_rate,
+                                 slow_threshold=slow_threshold, metrics=metrics)
+    if sample_rate <= 0:
+        return func
+    sample = random.random
+
+    @functools.wraps(func)
     def wrapper_log_queries(*args, **kwargs):
-       current_time = datetime.now()
-       print(f"{current_time.strftime("%H:%M:%S")}: Executing query: '{kwargs['query']}'")
-       print(f"Results: {func(*args, **kwargs)}")
+        if sample() >= sample_rate:
+            return func(*args, **kwargs)
+
+        result = error = None
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _record(_query_text(args, kwargs), result, elapsed, slow_threshold,
+                    metrics or registry, error)
     return wrapper_log_queries
 
+def _record(query, result, elapsed, slow_threshold, metrics, error=None):
+    rows = len(result) if error is None and hasattr(result, '__len__') else None
+    query_fingerprint = fingerprint(query)
+    status = 'ok' if error is None else 'error'
+    metrics.histogram(
+        'db_query_duration_seconds', 'Wall time of database queries.',
+        DURATION_BUCKETS, query=query_fingerprint, status=status
+    ).observe(elapsed)
+    if rows is not None:
+        metrics.histogram(
+            'db_query_rows', 'Rows returned by database queries.',
+            ROW_BUCKETS, query=query_fingerprint
+        ).observe(rows)
+
+    slow = slow_threshold is not None and elapsed >= slow_threshold
+    if error is not None:
+        outcome = f"failed ({type(error).__name__}: {error})"
+    else:
+        outcome = f"rows={rows}"
+    logger.log(
+        logging.WARNING if slow or error is not None else logging.INFO,
+        "%squery %.3fms %s: %s", "slow " if slow else "", elapsed * 1000,
+        outcome, query_fingerprint,
+        extra={'query': query, 'fingerprint': query_fingerprint,
+               'duration': elapsed, 'rows': rows, 'status': status}
+    )
+
 @log_queries
 def fetch_all_users(query):
     conn = sqlite3.connect('users.db')
@@ -21,4 +204,7 @@ def fetch_all_users(query):
     return results
 
 
-users = fetch_all_users(query="SELECT * FROM users")
\ No newline at end of file
+if __name__ == '__main__':
+    start_query_logging()
+    users = fetch_all_users(query="SELECT * FROM users")
+    print(f"Results: {users}")
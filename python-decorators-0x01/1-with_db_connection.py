@@ -1,18 +1,301 @@
+import asyncio
 import sqlite3 
+import inspect
 import functools
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+try:
+    import aiosqlite
+except ImportError:  # aiosqlite is only needed for async functions
+    aiosqlite = None
+
+DB_PATH = 'users.db'
+
+# Pragmas applied to every new connection, in order. WAL lets readers run
+# alongside a writer; with it synchronous=NORMAL only syncs at checkpoints.
+PERFORMANCE_PROFILE = {
+    'busy_timeout': 5000,            # ms to wait on a lock before "database is locked"
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,        # negative means KiB: 64 MiB page cache
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# What SQLite reports back for the named settings
+PRAGMA_VALUES = {
+    'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+    'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2},
+}
+
+def apply_profile(conn, profile=PERFORMANCE_PROFILE):
+    """
+    Set each pragma in profile on conn and read it back.
+    Raises sqlite3.OperationalError listing any pragma that did not take
+    effect (e.g. WAL on an in-memory database, or mmap_size above the
+    build's limit). Returns the values SQLite reports.
+    """
+    readings = {}
+    for name, value in profile.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+        readings[name] = conn.execute(f"PRAGMA {name}").fetchone()
+    return _verify_profile(profile, readings)
+
+async def apply_profile_async(conn, profile=PERFORMANCE_PROFILE):
+    """apply_profile for an aiosqlite connection"""
+    readings = {}
+    for name, value in profile.items():
+        await conn.execute(f"PRAGMA {name} = {value}")
+        async with conn.execute(f"PRAGMA {name}") as cursor:
+            readings[name] = await cursor.fetchone()
+    return _verify_profile(profile, readings)
+
+def _verify_profile(profile, readings):
+    effective = {}
+    mismatched = []
+    for name, value in profile.items():
+        row = readings[name]
+        actual = row[0] if row else None
+        expected = value
+        if isinstance(value, str):
+            expected = PRAGMA_VALUES.get(name, {}).get(value.upper(), value.lower())
+        if isinstance(actual, str):
+            actual = actual.lower()
+        effective[name] = actual
+        if actual != expected:
+            mismatched.append(f"{name}={actual!r} (wanted {value!r})")
+    if mismatched:
+        raise sqlite3.OperationalError("pragmas not applied: " + ", ".join(mismatched))
+    return effective
+
+def connect(db_path=DB_PATH, profile=PERFORMANCE_PROFILE, **kwargs):
+    """sqlite3.connect, then apply_profile (skipped when profile is None)"""
+    conn = sqlite3.connect(db_path, **kwargs)
+    if profile:
+        try:
+            apply_profile(conn, profile)
+        except Exception:
+            conn.close()
+            raise
+    return conn
+
+async def connect_async(db_path=DB_PATH, profile=PERFORMANCE_PROFILE, **kwargs):
+    """connect() for coroutines: an aiosqlite connection with the same profile"""
+    if aiosqlite is None:
+        raise ImportError("aiosqlite is required to decorate async functions")
+    conn = await aiosqlite.connect(db_path, **kwargs)
+    if profile:
+        try:
+            await apply_profile_async(conn, profile)
+        except Exception:
+            await conn.close()
+            raise
+    return conn
+
+class ConnectionPool:
+    """
+    Reuses SQLite connections instead of opening one per call.
+    At most max_size connections exist; idle ones are handed out most
+    recently used first, and nested calls in one thread share the
+    connection they already hold. Each connection keeps a cache of
+    cached_statements prepared statements and is opened with the pragmas
+    in profile (see apply_profile).
+    """
+
+    def __init__(self, db_path=DB_PATH, max_size=8, cached_statements=256, timeout=30,
+                 profile=PERFORMANCE_PROFILE):
+        self.db_path = db_path
+        self.profile = profile
+        self.max_size = max_size
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+
+    def _connect(self):
+        return connect(
+            self.db_path,
+            self.profile,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No connection to {self.db_path} available after {self.timeout}s")
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                # Same outcome as closing the connection without committing
+                conn.rollback()
+            # Undo per-call settings so the next caller gets a fresh connection
+            conn.isolation_level = ''
+            conn.row_factory = None
+            conn.text_factory = str
+            conn.set_trace_callback(None)
+        except Exception:
+            conn.close()
+            self._slots.release()
+            raise
+        with self._lock:
+            self._idle.append(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Connection for this thread, reused by nested calls"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class AsyncConnectionPool:
+    """
+    ConnectionPool for coroutines, over aiosqlite connections.
+    Nested calls within one task share its connection. aiosqlite
+    connections belong to the event loop that opened them, so the pool
+    starts over when it is used from a different loop. Idle connections
+    are closed when asyncio.run() winds the loop down (or by close()),
+    since their worker threads would otherwise keep the process alive.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_size=8, timeout=30, profile=PERFORMANCE_PROFILE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.profile = profile
+        self._loop = None
+        self._idle = []
+        self._held = contextvars.ContextVar(f'held_{id(self)}', default=None)
+
+    def _check_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Connections of an earlier loop cannot be awaited from this one
+            for conn in self._idle:
+                conn.stop()
+            self._loop = loop
+            self._idle = []
+            self._slots = asyncio.BoundedSemaphore(self.max_size)
+            self._closer = loop.create_task(self._close_on_shutdown())
+
+    async def _close_on_shutdown(self):
+        """Waits until cancelled (asyncio.run cancels leftover tasks on exit), then closes"""
+        try:
+            await self._loop.create_future()
+        except asyncio.CancelledError:
+            await self.close()
+            raise
+
+    async def acquire(self):
+        self._check_loop()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No connection to {self.db_path} available after {self.timeout}s")
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return await connect_async(self.db_path, self.profile)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except BaseException:
+            await conn.close()
+            raise
+        else:
+            self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self):
+        """Connection for this task, reused by nested calls"""
+        held = self._held.get()
+        if held is not None:
+            yield held
+            return
+        conn = await self.acquire()
+        token = self._held.set(conn)
+        try:
+            yield conn
+        finally:
+            self._held.reset(token)
+            await self.release(conn)
+
+    async def close(self):
+        if self._loop is not asyncio.get_running_loop():
+            return
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
+
+
+default_pool = ConnectionPool()
+default_async_pool = AsyncConnectionPool()
+
+def configure_pool(db_path=DB_PATH, **options):
+    """Replace the pools used by with_db_connection (e.g. another database file)"""
+    global default_pool, default_async_pool
+    default_pool.close()
+    default_pool = ConnectionPool(db_path, **options)
+    options.pop('cached_statements', None)
+    default_async_pool = AsyncConnectionPool(db_path, **options)
+    return default_pool
+
+def with_db_connection(func=None, *, pool=None):
+    """
+    automatically handles opening and closing database connections
+    Coroutine functions get a connection from an AsyncConnectionPool
+    (pool, or default_async_pool) instead.
+    """
+    if func is None:
+        return functools.partial(with_db_connection, pool=pool)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper_with_db_connection(*args, **kwargs):
+            async with (pool or default_async_pool).connection() as conn:
+                kwargs['conn'] = conn
+                return await func(*args, **kwargs)
+        return async_wrapper_with_db_connection
 
-def with_db_connection(func):
-    """automatically handles opening and closing database connections"""
     @functools.wraps(func)
     def wrapper_with_db_connection(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with (pool or default_pool).connection() as conn:
             kwargs['conn'] = conn
             return func(*args, **kwargs)
-        except Exception as e:
-            raise(e)
-        finally:
-            conn.close() 
     return wrapper_with_db_connection
 
 @with_db_connection 
@@ -21,6 +304,7 @@ def get_user_by_id(conn, user_id):
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,)) 
     return cursor.fetchone() 
 
-#### Fetch user by ID with automatic connection handling 
-user = get_user_by_id(user_id=1)
-print(user)
\ No newline at end of file
+if __name__ == '__main__':
+    #### Fetch user by ID with automatic connection handling 
+    user = get_user_by_id(user_id=1)
+    print(user)
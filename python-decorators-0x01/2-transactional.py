@@ -1,33 +1,299 @@
+import re
 import sqlite3 
+import inspect
 import functools
+import threading
+from concurrent.futures import Future
+
+connections = __import__('1-with_db_connection')
+
+WRITE_STATEMENT = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)"
+    r"\s+[\"`\[]?(\w+)",
+    re.IGNORECASE
+)
+
+commit_listeners = []
+
+def on_commit(listener):
+    """Call listener(tables) after every transactional commit that wrote to tables"""
+    commit_listeners.append(listener)
+    return listener
+
+def written_tables(statements):
+    """Names of the tables changed by the given SQL statements"""
+    tables = set()
+    for sql in statements:
+        match = WRITE_STATEMENT.match(sql)
+        if match:
+            tables.add(match.group(1).lower())
+    return tables
+
+class RecordingConnection:
+    """
+    Stands in for the connection while a write batch is active: writes
+    are recorded for the batch instead of being run. Reads are refused.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.rowcount = -1
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, tuple(params)))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        for params in seq_of_params:
+            self.execute(sql, params)
+        return self
+
+    def _no_reads(self, *args):
+        raise sqlite3.ProgrammingError("reads are not available inside a write batch")
+
+    fetchone = fetchmany = fetchall = _no_reads
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+_batches = threading.local()
+
+def active_batch():
+    """The WriteBatch entered by the current thread, if any"""
+    stack = getattr(_batches, 'stack', None)
+    return stack[-1] if stack else None
+
+
+class WriteBatch:
+    """
+    Groups many small @transactional calls into one transaction.
+    Inside "with WriteBatch() as batch:" decorated calls are recorded and
+    return a Future instead of touching the database. Recorded calls are
+    flushed once max_size are pending or max_delay seconds after the
+    first one, and on exit: consecutive statements with the same SQL go
+    through one executemany, all in a single transaction.
+    If that transaction fails it is rolled back and the calls are
+    replayed one savepoint each, so only the failing calls are rolled
+    back and their Futures carry the error. Batches are written on a
+    connection from pool (default: the with_db_connection pool).
+    """
+
+    def __init__(self, pool=None, max_size=1000, max_delay=0.5):
+        self.pool = pool
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._pending = []
+        self._lock = threading.Lock()
+        # Held for a whole flush so batches commit in submission order
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def __enter__(self):
+        if not hasattr(_batches, 'stack'):
+            _batches.stack = []
+        _batches.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _batches.stack.pop()
+        self.flush()
+
+    def submit(self, statements, result=None):
+        """Queue one call's statements; the Future resolves to result once committed"""
+        future = Future()
+        with self._lock:
+            self._pending.append((statements, result, future))
+            full = len(self._pending) >= self.max_size
+            if not full and self._timer is None and self.max_delay is not None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return future
+
+    def flush(self):
+        """Write every pending call now"""
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                units, self._pending = self._pending, []
+            if not units:
+                return
+            errors = self._write(units)
+            _notify_commit([sql for (statements, _, _), error in zip(units, errors)
+                            if error is None for sql, _ in statements])
+
+        for (_, result, future), error in zip(units, errors):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _write(self, units):
+        """Commit units in one transaction; returns per-call errors"""
+        pool = self.pool if self.pool is not None else connections.default_pool
+        try:
+            with pool.connection() as conn:
+                try:
+                    conn.execute("BEGIN")
+                    for sql, params_list in _runs(units):
+                        conn.executemany(sql, params_list)
+                    conn.execute("COMMIT")
+                    return [None] * len(units)
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    return self._replay(conn, units)
+        except Exception as e:
+            return [e] * len(units)
+
+    def _replay(self, conn, units):
+        """Run each call under its own savepoint; returns per-call errors"""
+        errors = []
+        conn.execute("BEGIN")
+        for statements, _, _ in units:
+            conn.execute("SAVEPOINT batched_call")
+            try:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+            except Exception as e:
+                conn.execute("ROLLBACK TO batched_call")
+                errors.append(e)
+            else:
+                errors.append(None)
+            conn.execute("RELEASE batched_call")
+        conn.execute("COMMIT")
+        return errors
+
+def _runs(units):
+    """Consecutive statements sharing the same SQL, as (sql, [params, ...])"""
+    runs = []
+    for statements, _, _ in units:
+        for sql, params in statements:
+            if runs and runs[-1][0] == sql:
+                runs[-1][1].append(params)
+            else:
+                runs.append((sql, [params]))
+    return runs
 
 def with_db_connection(func):
     """automatically handles opening and closing database connections""" 
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper_with_db_connection(*args, **kwargs):
+            async with connections.default_async_pool.connection() as conn:
+                kwargs['conn'] = conn
+                return await func(*args, **kwargs)
+        return async_wrapper_with_db_connection
+
     @functools.wraps(func)
     def wrapper_with_db_connection(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        if active_batch() is not None:
+            # The batch owns the real connection; record the call's writes
+            kwargs['conn'] = RecordingConnection()
+            return func(*args, **kwargs)
+        with connections.default_pool.connection() as conn:
             kwargs['conn'] = conn
             return func(*args, **kwargs)
-        except Exception as e:
-            raise(e)
-        finally:
-            conn.close() 
     return wrapper_with_db_connection
 
+def _notify_commit(statements):
+    tables = written_tables(statements)
+    if tables:
+        for listener in commit_listeners:
+            listener(tables)
+
+SAVEPOINT = "transactional_nested"
+
 def transactional(func):
-    """ensures a function running a database operation is wrapped inside a transaction"""
+    """
+    ensures a function running a database operation is wrapped inside a transaction
+    A call made while the connection is already in a transaction (e.g.
+    nested decorated calls sharing a pooled connection) runs under a
+    savepoint instead: its failure only undoes its own writes, and the
+    outermost transaction commits and notifies the listeners.
+    Coroutine functions get the same treatment on an aiosqlite
+    connection; WriteBatch only collects synchronous calls.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper_transactional(*args, **kwargs):
+            conn = kwargs['conn']
+            if conn.in_transaction:
+                await conn.execute(f"SAVEPOINT {SAVEPOINT}")
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException:
+                    await conn.execute(f"ROLLBACK TO {SAVEPOINT}")
+                    await conn.execute(f"RELEASE {SAVEPOINT}")
+                    raise
+                await conn.execute(f"RELEASE {SAVEPOINT}")
+                return result
+
+            statements = []
+            await conn.set_trace_callback(statements.append)
+            try:
+                # An explicit BEGIN stops sqlite3 from opening its own transaction
+                await conn.execute("BEGIN")
+                result = await func(*args, **kwargs)
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+            finally:
+                await conn.set_trace_callback(None)
+            _notify_commit(statements)
+            return result
+        return async_wrapper_transactional
+
     @functools.wraps(func)
     def wrapper_transactional(*args, **kwargs):
         conn = kwargs['conn']
+        batch = active_batch()
+        if batch is not None:
+            if not isinstance(conn, RecordingConnection):
+                conn = kwargs['conn'] = RecordingConnection()
+            result = func(*args, **kwargs)
+            return batch.submit(conn.statements, result)
+
+        if conn.in_transaction:
+            conn.execute(f"SAVEPOINT {SAVEPOINT}")
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                conn.execute(f"ROLLBACK TO {SAVEPOINT}")
+                conn.execute(f"RELEASE {SAVEPOINT}")
+                raise
+            conn.execute(f"RELEASE {SAVEPOINT}")
+            return result
+
+        statements = []
+        conn.set_trace_callback(statements.append)
         try:
-            conn.isolation_level = None
+            # An explicit BEGIN stops sqlite3 from opening its own transaction
+            conn.execute("BEGIN")
             result = func(*args, **kwargs)
             conn.commit()
-            return result
         except Exception as e:
             conn.rollback()
             raise(e)
+        finally:
+            conn.set_trace_callback(None)
+
+        _notify_commit(statements)
+        return result
 
     return wrapper_transactional
 
@@ -37,5 +303,6 @@ def update_user_email(conn, user_id, new_email):
     cursor = conn.cursor() 
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id)) 
 
-#### Update user's email with automatic transaction handling 
-update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
+if __name__ == '__main__':
+    #### Update user's email with automatic transaction handling 
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
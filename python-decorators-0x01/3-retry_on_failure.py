@@ -1,36 +1,237 @@
 import time
+import random
+import asyncio
 import sqlite3 
+import inspect
+import logging
 import functools
+import threading
+
+connections = __import__('1-with_db_connection')
+
+logger = logging.getLogger(__name__)
+
+# MySQL error codes worth retrying: lock wait timeout, deadlock,
+# server gone away / lost connection
+MYSQL_RETRYABLE_ERRNOS = {1205, 1213, 2006, 2013}
+SQLITE_RETRYABLE_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+def is_retryable(error):
+    """True for transient errors (lock contention, deadlocks, lost connections)"""
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in SQLITE_RETRYABLE_MESSAGES)
+    return getattr(error, 'errno', None) in MYSQL_RETRYABLE_ERRNOS
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the database while the circuit is open"""
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the traffic, shared by every caller.
+    Each first attempt deposits ratio tokens (up to max_tokens) and each
+    retry spends one, so under a failure storm retries add at most ratio
+    extra load instead of multiplying it.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+TRIAL = 'trial'
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed calls and rejects
+    calls for reset_timeout seconds; then lets one trial call through.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        False while open; TRIAL for the one call let through after
+        reset_timeout (it must end with record_success, record_failure
+        or end_trial); True otherwise.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return TRIAL
+
+    def end_trial(self):
+        """Let another trial through if the current one ended without a verdict"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+default_budget = RetryBudget()
 
 def with_db_connection(func):
     """automatically handles opening and closing database connections"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper_with_db_connection(*args, **kwargs):
+            async with connections.default_async_pool.connection() as conn:
+                kwargs['conn'] = conn
+                return await func(*args, **kwargs)
+        return async_wrapper_with_db_connection
+
     @functools.wraps(func) 
     def wrapper_with_db_connection(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with connections.default_pool.connection() as conn:
             kwargs['conn'] = conn
-            result = func(*args, **kwargs)
-            conn.close() 
-            return result
-        except Exception as e:
-            raise(e)
+            return func(*args, **kwargs)
 
     return wrapper_with_db_connection
 
-def retry_on_failure(retries=3, delay=2):
-    """retries database operations if they fail due to transient errors"""
+def backoff_delay(attempt, delay, max_delay):
+    """Full jitter: uniform between 0 and the capped exponential delay"""
+    return random.uniform(0, min(max_delay, delay * 2 ** attempt))
+
+def retry_on_failure(retries=3, delay=2, max_delay=30, deadline=None,
+                     retryable=is_retryable, budget=default_budget, breaker=None):
+    """
+    retries database operations if they fail due to transient errors
+    retries is the total number of attempts. Waits use exponential backoff with full jitter. Errors that
+    retryable() rejects are raised at once, and the last error is raised
+    once retries, the deadline (seconds per call) or the shared retry
+    budget run out. An optional CircuitBreaker stops calls entirely
+    while the database keeps failing; it counts calls that gave up on
+    a retryable error, never errors retryable() rejects, and is
+    consulted once per call. Coroutine functions wait with asyncio.sleep
+    so the event loop keeps running.
+    """
     def decorator_retry_on_failure(func):
+        def start():
+            if budget is not None:
+                budget.deposit()
+            return time.monotonic() + deadline if deadline is not None else None
+
+        def check_breaker():
+            """Returns the breaker's permit for this call (see CircuitBreaker.allow)"""
+            if breaker is None:
+                return True
+            permit = breaker.allow()
+            if not permit:
+                raise CircuitOpenError(f"{func.__name__}: circuit open")
+            return permit
+
+        def finished(permit):
+            # A trial that ended without a verdict (cancelled, BaseException)
+            # must not keep the breaker half-open forever
+            if permit == TRIAL:
+                breaker.end_trial()
+
+        def succeeded():
+            if breaker is not None:
+                breaker.record_success()
+
+        def next_wait(error, attempt, expires):
+            """Seconds to wait before retrying after error, or None to give up"""
+            if not retryable(error):
+                # The database answered; a caller bug must not trip the breaker
+                succeeded()
+                return None
+            wait = None
+            if attempt + 1 < retries:
+                wait = backoff_delay(attempt, delay, max_delay)
+                if expires is not None and time.monotonic() + wait > expires:
+                    wait = None
+                elif budget is not None and not budget.withdraw():
+                    wait = None
+            if wait is None:
+                # One failure per call that gave up, not per attempt
+                if breaker is not None:
+                    breaker.record_failure()
+                return None
+            logger.warning("%s failed (%s); retry %d in %.2fs",
+                           func.__name__, error, attempt + 1, wait)
+            return wait
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper_retry_on_failure(*args, **kwargs):
+                permit = check_breaker()
+                try:
+                    expires = start()
+                    attempt = 0
+                    while True:
+                        try:
+                            result = await func(*args, **kwargs)
+                        except Exception as e:
+                            wait = next_wait(e, attempt, expires)
+                            if wait is None:
+                                raise
+                            await asyncio.sleep(wait)
+                            attempt += 1
+                        else:
+                            succeeded()
+                            return result
+                finally:
+                    finished(permit)
+            return async_wrapper_retry_on_failure
+
         @functools.wraps(func)
         def wrapper_retry_on_failure(*args, **kwargs):
-            tries = 0
-            while tries < retries:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    print(e)
-                    tries += 1
-                    time.sleep(delay)
-                
+            permit = check_breaker()
+            try:
+                expires = start()
+                attempt = 0
+                while True:
+                    try:
+                        result = func(*args, **kwargs)
+                    except Exception as e:
+                        wait = next_wait(e, attempt, expires)
+                        if wait is None:
+                            raise
+                        time.sleep(wait)
+                        attempt += 1
+                    else:
+                        succeeded()
+                        return result
+            finally:
+                finished(permit)
+
         return wrapper_retry_on_failure
     return decorator_retry_on_failure
 
@@ -41,6 +242,7 @@ def fetch_users_with_retry(conn):
     cursor.execute("SELECT * FROM users")
     return cursor.fetchall()
 
-#### attempt to fetch users with automatic retry on failure
-users = fetch_users_with_retry()
-print(users)
\ No newline at end of file
+if __name__ == '__main__':
+    #### attempt to fetch users with automatic retry on failure
+    users = fetch_users_with_retry()
+    print(users)
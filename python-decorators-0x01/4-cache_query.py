@@ -1,37 +1,334 @@
+import re
+import sys
 import time
-import sqlite3 
+import pickle
+import asyncio
+import inspect
 import functools
+import threading
+from collections import OrderedDict
 
+connections = __import__('1-with_db_connection')
+transactional = __import__('2-transactional')
 
-query_cache = {}
+READ_TABLE = re.compile(r"\b(?:FROM|JOIN)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+
+
+FRESH, STALE, MISS = 'fresh', 'stale', 'miss'
+
+def result_size(result):
+    """
+    Bytes a cached result is charged for: its pickled size, or for
+    results that cannot be pickled (e.g. lists of sqlite3.Row) the
+    in-memory size of the result, its rows and their values.
+    """
+    try:
+        return len(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        pass
+    size = sys.getsizeof(result)
+    if isinstance(result, (list, tuple)):
+        for row in result:
+            size += sys.getsizeof(row)
+            try:
+                size += sum(sys.getsizeof(value) for value in row)
+            except TypeError:
+                pass
+    return size
+
+
+class _Flight:
+    """One in-progress run() that concurrent callers for the same key share"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QueryCache:
+    """
+    Query-result cache keyed by SQL text and parameters.
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted once there are more than max_entries or the cached results
+    take more than max_bytes (measured as their pickled size, see result_size). Entries are
+    tagged with the tables they read so writes can invalidate them.
+    For stale_ttl seconds after expiring an entry is still served (see
+    get_or_run) while one background refresh replaces it.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=300, stale_ttl=30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; results computed before one are not stored
+        self._generation = 0
+        self._inflight = {}
+        self._async_inflight = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                      'invalidations': 0, 'stale_hits': 0, 'refreshes': 0, 'collapsed': 0}
+
+    @staticmethod
+    def make_key(query, params=()):
+        return query, tuple(params or ())
+
+    def lookup(self, key):
+        """Returns (FRESH, result), (STALE, result) or (MISS, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return MISS, None
+            result, size, expires, tables = entry
+            now = time.monotonic()
+            if expires is not None and expires <= now:
+                if now < expires + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['stale_hits'] += 1
+                    return STALE, result
+                self._remove(key)
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return MISS, None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return FRESH, result
+
+    def get(self, key):
+        """Returns (True, result) on a fresh hit, (False, None) otherwise"""
+        state, result = self.lookup(key)
+        if state == FRESH:
+            return True, result
+        return False, None
+
+    def set(self, key, result, ttl=None, generation=None):
+        """Store result; skipped if generation predates an invalidation"""
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        tables = {table.lower() for table in READ_TABLE.findall(key[0])}
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, expires, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def get_or_run(self, key, run, ttl=None, refresh=None):
+        """
+        Cached result for key, or the result of run(), stored with ttl.
+        Concurrent callers missing the same key wait for a single run()
+        and share its result (or its error). A stale entry is returned
+        as is while refresh() (default run) recomputes it once, in a
+        background thread.
+        """
+        state, result = self.lookup(key)
+        if state == FRESH:
+            return result
+        if state == STALE:
+            flight, leader = self._join(key)
+            if leader:
+                self.stats['refreshes'] += 1
+                threading.Thread(
+                    target=self._refresh, args=(key, flight, refresh or run, ttl), daemon=True
+                ).start()
+            return result
+
+        flight, leader = self._join(key)
+        if leader:
+            return self._fly(key, flight, run, ttl)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _join(self, key):
+        """Returns (flight, True) for a new flight, (flight, False) for one in progress"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.stats['collapsed'] += 1
+                return flight, False
+            flight = self._inflight[key] = _Flight(self._generation)
+            return flight, True
+
+    def _fly(self, key, flight, run, ttl):
+        try:
+            flight.result = run()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            self.set(key, flight.result, ttl, flight.generation)
+            return flight.result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _refresh(self, key, flight, refresh, ttl):
+        try:
+            self._fly(key, flight, refresh, ttl)
+        except Exception:
+            pass  # keep serving the stale entry; once it is gone a caller reruns the query
+
+    async def aget_or_run(self, key, run, ttl=None, refresh=None):
+        """
+        get_or_run for coroutines: concurrent coroutines missing the same
+        key (on one event loop) share a single run(), and stale entries are
+        refreshed by a background task.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            state, result = self.lookup(key)
+            if state == FRESH:
+                return result
+            inflight = (loop, key)
+            task = self._async_inflight.get(inflight)
+            if state == STALE:
+                if task is None:
+                    self.stats['refreshes'] += 1
+                    task = self._start_task(loop, key, refresh or run, ttl)
+                    # Nobody awaits a refresh; retrieve its error so it is not reported
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return result
+            if task is None:
+                task = self._start_task(loop, key, run, ttl)
+                # Cancelling the caller that started the query cancels it,
+                # since run() uses that caller's connection
+                return await task
+            self.stats['collapsed'] += 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if task.cancelled():
+                    continue  # its starter was cancelled; start over
+                raise
+
+    def _start_task(self, loop, key, run, ttl):
+        inflight = (loop, key)
+        task = loop.create_task(self._arun(key, run, ttl, self._generation))
+        self._async_inflight[inflight] = task
+        task.add_done_callback(lambda _: self._async_inflight.pop(inflight, None))
+        return task
+
+    async def _arun(self, key, run, ttl, generation):
+        result = await run()
+        self.set(key, result, ttl, generation)
+        return result
+
+    def _remove(self, key):
+        _, size, _, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_tables(self, tables):
+        """Drop every entry that read one of tables"""
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._remove(key)
+                    self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+query_cache = QueryCache()
+
+# Writes committed through @transactional invalidate cached reads of those tables
+transactional.on_commit(query_cache.invalidate_tables)
 
 def with_db_connection(func):
     """automatically handles opening and closing database connections"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper_with_db_connection(*args, **kwargs):
+            async with connections.default_async_pool.connection() as conn:
+                kwargs['conn'] = conn
+                return await func(*args, **kwargs)
+        return async_wrapper_with_db_connection
+
     @functools.wraps(func) 
     def wrapper_with_db_connection(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with connections.default_pool.connection() as conn:
             kwargs['conn'] = conn
-            result = func(*args, **kwargs)
-            return result
-        finally:
-            conn.close() 
+            return func(*args, **kwargs)
 
     return wrapper_with_db_connection
 
-def cache_query(func):
-    """caches the results of a database queries inorder to avoid redundant calls"""
+def cache_query(func=None, *, cache=None, ttl=None):
+    """
+    caches the results of a database queries inorder to avoid redundant calls
+    Concurrent misses for the same query run it once. Stale entries are
+    refreshed in the background on a pooled connection of their own,
+    since the caller's connection is closed once it has its answer.
+    """
+    if func is None:
+        return functools.partial(cache_query, cache=cache, ttl=ttl)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper_cache_query(*args, **kwargs):
+            store = cache if cache is not None else query_cache
+            key = store.make_key(kwargs['query'], kwargs.get('params'))
+
+            async def refresh():
+                pool = connections.default_async_pool
+                conn = await pool.acquire()
+                try:
+                    return await func(*args, **{**kwargs, 'conn': conn})
+                finally:
+                    await pool.release(conn)
+
+            return await store.aget_or_run(
+                key, lambda: func(*args, **kwargs), ttl, refresh if 'conn' in kwargs else None
+            )
+        return async_wrapper_cache_query
+
     @functools.wraps(func) 
     def wrapper_cache_query(*args, **kwargs):
-        query = kwargs['query']
+        store = cache if cache is not None else query_cache
+        key = store.make_key(kwargs['query'], kwargs.get('params'))
 
-        if query in query_cache:
-            return query_cache[query]
-        
-        else:
-            result = func(*args, **kwargs)
-            query_cache[query] = result
-            return result
+        def refresh():
+            with connections.default_pool.connection() as conn:
+                return func(*args, **{**kwargs, 'conn': conn})
+
+        return store.get_or_run(
+            key, lambda: func(*args, **kwargs), ttl, refresh if 'conn' in kwargs else None
+        )
 
     return wrapper_cache_query
 
@@ -42,9 +339,10 @@ def fetch_users_with_cache(conn, query):
     cursor.execute(query)
     return cursor.fetchall()
 
-#### First call will cache the result
-users = fetch_users_with_cache(query="SELECT * FROM users")
-print(users)
-#### Second call will use the cached result
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
-print(users_again)
\ No newline at end of file
+if __name__ == '__main__':
+    #### First call will cache the result
+    users = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users)
+    #### Second call will use the cached result
+    users_again = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users_again)
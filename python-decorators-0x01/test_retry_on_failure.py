@@ -0,0 +1,99 @@
+import time
+import asyncio
+import sqlite3
+import unittest
+
+retry = __import__('3-retry_on_failure')
+
+
+def locked():
+    return sqlite3.OperationalError("database is locked")
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        self.outcomes = []
+
+        @retry.retry_on_failure(retries=2, delay=0, budget=None, breaker=self.breaker)
+        def call():
+            outcome = self.outcomes.pop(0)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        self.call = call
+
+    def test_open_half_open_closed(self):
+        self.outcomes = [locked(), locked()]
+        with self.assertRaises(sqlite3.OperationalError):
+            self.call()
+        # open: rejected without running
+        with self.assertRaises(retry.CircuitOpenError):
+            self.call()
+        time.sleep(0.06)
+        # half-open: the trial fails once, is retried and succeeds
+        self.outcomes = [locked(), 'ok']
+        self.assertEqual(self.call(), 'ok')
+        # closed
+        self.outcomes = ['again']
+        self.assertEqual(self.call(), 'again')
+
+    def test_failed_trial_reopens(self):
+        self.outcomes = [locked(), locked()]
+        with self.assertRaises(sqlite3.OperationalError):
+            self.call()
+        time.sleep(0.06)
+        self.outcomes = [locked(), locked()]
+        with self.assertRaises(sqlite3.OperationalError):
+            self.call()
+        with self.assertRaises(retry.CircuitOpenError):
+            self.call()
+        time.sleep(0.06)
+        self.outcomes = ['ok']
+        self.assertEqual(self.call(), 'ok')
+
+    def test_cancelled_trial_lets_the_next_call_through(self):
+        @retry.retry_on_failure(retries=2, delay=0, budget=None, breaker=self.breaker)
+        async def call():
+            outcome = self.outcomes.pop(0)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        self.outcomes = [locked(), locked()]
+        with self.assertRaises(sqlite3.OperationalError):
+            asyncio.run(call())
+        time.sleep(0.06)
+        self.outcomes = [asyncio.CancelledError()]
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(call())
+        self.outcomes = ['ok']
+        self.assertEqual(asyncio.run(call()), 'ok')
+
+    def test_syntax_errors_do_not_open(self):
+        self.outcomes = [sqlite3.OperationalError("near \"SELEC\": syntax error")] * 3
+        for _ in range(3):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.call()
+        self.outcomes = ['ok']
+        self.assertEqual(self.call(), 'ok')
+
+
+class RetryCountTest(unittest.TestCase):
+
+    def test_retries_is_total_attempts(self):
+        attempts = []
+
+        @retry.retry_on_failure(retries=3, delay=0, budget=None)
+        def call():
+            attempts.append(1)
+            raise locked()
+
+        with self.assertRaises(sqlite3.OperationalError):
+            call()
+        self.assertEqual(len(attempts), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
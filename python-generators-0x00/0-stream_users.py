@@ -1,31 +1,25 @@
 import mysql.connector
-import os
+pool = __import__('pool')
+query = __import__('query')
+rows = __import__('rows')
 
 def stream_users():
     """
     Generator that yields each row from the 'user_data' table one by one.
+    Rows are UserRow named tuples (user_id, name, email, age).
     """
-    db_config = {
-        "host": os.getenv("MY_DB_HOST"),
-        "user": os.getenv("MY_DB_USER"),
-        "password": os.getenv("MY_DB_PASSWORD"),
-        "database": "ALX_prodev"
-    }
-
+    sql, params, _ = query.build_select()
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM user_data")
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
 
-        # Single loop to yield rows one by one
-        for row in iter(cursor.fetchone, None):
-            yield row
+                # Single loop to yield rows one by one
+                for row in iter(cursor.fetchone, None):
+                    yield rows.UserRow._make(row)
+            finally:
+                pool.close_cursor(conn, cursor)
 
     except mysql.connector.Error as e:
         print(f"Database error: {e}")
-
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
@@ -1,52 +1,74 @@
-import os
 import mysql.connector
+query = __import__('query')
+columnar = __import__('columnar')
+pool = __import__('pool')
+rows = __import__('rows')
 
-def stream_users_in_batches(batch_size):
+def stream_users_in_batches(batch_size, server_side=False, where=None, columns=None,
+                            columnar_output=False, as_rows=False):
     """
     Generator that fetches rows from 'user_data' in batches.
     Each batch is a list of dictionaries.
+    With server_side=True a single unbuffered query is streamed and each
+    batch is pulled with fetchmany, so no COUNT or OFFSET scans are needed.
+    where and columns are compiled to SQL (see query.build_select) so only
+    matching rows and selected columns are transferred.
+    With columnar_output=True each batch is a {column: numpy array} struct
+    of arrays instead (see columnar.to_columns), and with as_rows=True a
+    list of rows.UserRow.
     """
-    db_config = {
-        "host": os.getenv("MY_DB_HOST"),
-        "user": os.getenv("MY_DB_USER"),
-        "password": os.getenv("MY_DB_PASSWORD"),
-        "database": "ALX_prodev"
-    }
+    sql, params, names = query.build_select(columns, where)
+    if columnar_output:
+        make_batch = lambda fetched: columnar.to_columns(names, fetched)
+    else:
+        make_row = rows.row_factory(names, as_rows)
+        make_batch = lambda fetched: [make_row(row) for row in fetched]
 
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM user_data")
-        total_rows = cursor.fetchone()[0]
-
-        for offset in range(0, total_rows, batch_size):
-            cursor.execute(
-                "SELECT user_id, name, email, age FROM user_data LIMIT %s OFFSET %s",
-                (batch_size, offset)
-            )
-            rows = cursor.fetchall()
-            # Convert tuples to dicts
-            batch = [dict(zip(['user_id','name','email','age'], row)) for row in rows]
-            yield batch
+        with pool.connection() as conn:
+            if server_side:
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(sql, params)
+                    for fetched in iter(lambda: cursor.fetchmany(batch_size), []):
+                        yield make_batch(fetched)
+                finally:
+                    pool.close_cursor(conn, cursor)
+                return
+
+            cursor = conn.cursor()
+            try:
+                count_sql, count_params = query.compile_where(where)
+                cursor.execute("SELECT COUNT(*) FROM user_data" + count_sql, count_params)
+                total_rows = cursor.fetchone()[0]
+
+                for offset in range(0, total_rows, batch_size):
+                    cursor.execute(
+                        sql + " LIMIT %s OFFSET %s",
+                        (*params, batch_size, offset)
+                    )
+                    fetched = cursor.fetchall()
+                    # Convert tuples to dicts (or arrays)
+                    yield make_batch(fetched)
+            finally:
+                cursor.close()
 
     except mysql.connector.Error as e:
         print(f"Database error: {e}")
 
-    finally:
-        if 'cursor' in locals() and cursor:
-            cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
-
 
-def batch_processing(batch_size):
+def batch_processing(batch_size, where=None, columns=None, columnar_output=False):
     """
     Processes each batch from stream_users_in_batches,
     filtering users older than 25.
+    The filter runs in SQL; pass where/columns to change it.
+    Columnar batches can be filtered further with columnar.filter_batch.
     """
-    for batch in stream_users_in_batches(batch_size):
-        filtered = [user for user in batch if user['age'] > 25]
-        yield filtered  # Yield each filtered batch instead of returning immediately
+    if where is None:
+        where = {"age__gt": 25}
+    for batch in stream_users_in_batches(batch_size, where=where, columns=columns,
+                                         columnar_output=columnar_output):
+        yield batch  # Yield each filtered batch instead of returning immediately
 
 
 __all__ = ['stream_users_in_batches', 'batch_processing']
@@ -1,36 +1,137 @@
 #!/usr/bin/python3
-seed = __import__('seed')
+import base64
+import queue
+import threading
+pool = __import__('pool')
+query = __import__('query')
+rows = __import__('rows')
 
-def paginate_users(page_size, offset):
+def paginate_users(page_size, offset, as_rows=False):
     """
     Fetches a page of users from the user_data table.
-    Returns a list of dictionaries.
+    Returns a list of dictionaries (rows.UserRow with as_rows=True).
     """
-    conn = seed.connect_to_prodev()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM user_data LIMIT %s OFFSET %s", (page_size, offset))
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
+    sql, params, names = query.build_select()
+    make_row = rows.row_factory(names, as_rows)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql + " LIMIT %s OFFSET %s", (*params, page_size, offset))
+        page = [make_row(row) for row in cursor.fetchall()]
+        cursor.close()
+    return page
 
-def lazy_paginate(page_size):
+def encode_cursor(user_id):
+    """Builds an opaque page cursor from the last user_id seen."""
+    return base64.urlsafe_b64encode(str(user_id).encode()).decode()
+
+def decode_cursor(page_cursor):
+    """Recovers the user_id stored in a page cursor."""
+    return base64.urlsafe_b64decode(page_cursor.encode()).decode()
+
+def paginate_users_after(page_size, page_cursor=None, as_rows=False):
+    """
+    Fetches the page of users that follows page_cursor (keyset pagination).
+    Seeks on the user_id primary key instead of skipping rows with OFFSET,
+    so every page costs the same.
+    Returns (rows, next_cursor); next_cursor is None after the last page.
+    """
+    where = None
+    if page_cursor is not None:
+        where = {'user_id__gt': decode_cursor(page_cursor)}
+    sql, params, names = query.build_select(where=where)
+    make_row = rows.row_factory(names, as_rows)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql + query.ORDER_BY_KEY + " LIMIT %s", (*params, page_size))
+        fetched = cursor.fetchall()
+        cursor.close()
+
+    next_cursor = None
+    if len(fetched) == page_size:
+        next_cursor = encode_cursor(fetched[-1][names.index('user_id')])
+    return [make_row(row) for row in fetched], next_cursor
+
+def read_ahead(pages, depth):
+    """
+    Generator that runs the pages iterator in a background thread and
+    keeps up to depth pages buffered ahead of the consumer.
+    The producer blocks once the buffer is full (backpressure).
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(('page', page)):
+                    return
+            put(('done', None))
+        except Exception as e:
+            put(('error', e))
+        finally:
+            close = getattr(pages, 'close', None)
+            if close:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, item = buffer.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def lazy_paginate(page_size, keyset=False, page_cursor=None, prefetch=0, as_rows=False):
     """
     Generator that lazily fetches pages of user_data.
     Fetches the next page only when needed.
+    With keyset=True pages are read with paginate_users_after, optionally
+    resuming after page_cursor.
+    With prefetch > 0 up to that many upcoming pages are fetched in a
+    background thread while the caller consumes the current one.
+    With as_rows=True pages hold rows.UserRow instead of dictionaries.
     """
+    pages = _fetch_pages(page_size, keyset, page_cursor, as_rows)
+    if prefetch:
+        pages = read_ahead(pages, prefetch)
+    yield from pages
+
+def _fetch_pages(page_size, keyset=False, page_cursor=None, as_rows=False):
+    """Generator behind lazy_paginate, fetching one page per step"""
+    if keyset:
+        while True:
+            page, page_cursor = paginate_users_after(page_size, page_cursor, as_rows)
+            if page:
+                yield page
+            if page_cursor is None:
+                return
+
     # Get total number of rows
-    conn = seed.connect_to_prodev()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM user_data")
-    total_rows = cursor.fetchone()[0]
-    cursor.close()
-    conn.close()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        total_rows = cursor.fetchone()[0]
+        cursor.close()
 
     offset = 0
     # Single loop to yield pages one by one
     while offset < total_rows:
-        yield paginate_users(page_size, offset)
+        yield paginate_users(page_size, offset, as_rows)
         offset += page_size
 
-__all__ = ['paginate_users', 'lazy_paginate']
+__all__ = ['paginate_users', 'paginate_users_after', 'lazy_paginate']
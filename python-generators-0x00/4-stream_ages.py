@@ -1,25 +1,37 @@
 #!/usr/bin/python3
-seed = __import__('seed')
+pool = __import__('pool')
+aggregates = __import__('aggregates')
+query = __import__('query')
 
 def stream_user_ages():
     """
     Generator that yields ages of users one by one.
     """
-    conn = seed.connect_to_prodev()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT age FROM user_data")
-    
-    for row in cursor:
-        yield row['age']  # Yield age directly
-    
-    cursor.close()
-    conn.close()
-
-
-def calculate_average_age():
+    sql, params, _ = query.build_select(['age'])
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+
+            for (age,) in cursor:
+                yield age  # Yield age directly (an int, see query.select_expression)
+        finally:
+            pool.close_cursor(conn, cursor)
+
+
+def calculate_average_age(pushdown=False):
     """
     Calculates the average age using the generator without loading all data at once.
+    With pushdown=True MySQL computes the average instead.
     """
+    if pushdown:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(SUM(age) DIV COUNT(*), 0) FROM user_data")
+            avg_age = cursor.fetchone()[0]
+            cursor.close()
+        return int(avg_age)
+
     total_age = 0
     count = 0
 
@@ -32,6 +44,18 @@ def calculate_average_age():
     return total_age // count
 
 
+def age_statistics(pushdown=True, **options):
+    """
+    Count, mean, variance, min/max, quantiles and histogram of user ages.
+    pushdown=True asks MySQL for them; pushdown=False computes them in a
+    single constant-memory pass over stream_user_ages().
+    """
+    if not pushdown:
+        return aggregates.summarize(stream_user_ages(), **options)
+    with pool.connection() as conn:
+        return aggregates.summarize_sql(conn, 'age', **options)
+
+
 if __name__ == '__main__':
     avg_age = calculate_average_age()  # Loop 2 is optional if we used another iteration inside main
     print(f"Average age of users: {avg_age}")
@@ -0,0 +1,229 @@
+"""Streaming aggregates over user_data, pushed down to SQL or computed in one pass"""
+import math
+query = __import__('query')
+
+class RunningStats:
+    """Count, mean, variance (Welford), min and max in constant memory"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def push(self, value):
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Combine with stats computed over another part of the data"""
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance (same as SQL VAR_POP)"""
+        return self.m2 / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance) if self.count else None
+
+
+class Histogram:
+    """Counts of values in fixed-width bins"""
+
+    def __init__(self, bin_width=10):
+        self.bin_width = bin_width
+        self.bins = {}
+
+    def push(self, value):
+        start = math.floor(float(value) / self.bin_width) * self.bin_width
+        self.bins[start] = self.bins.get(start, 0) + 1
+
+    def merge(self, other):
+        for start, count in other.bins.items():
+            self.bins[start] = self.bins.get(start, 0) + count
+        return self
+
+
+class TDigest:
+    """
+    Approximate quantiles (merging t-digest).
+    Values are buffered and periodically merged into a bounded number of
+    centroids that are small near the tails and larger in the middle.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.centroids = []
+        self.buffer = []
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def push(self, value, weight=1):
+        value = float(value)
+        self.buffer.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        for mean, weight in other.centroids + other.buffer:
+            self.push(mean, weight)
+        if other.count:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        return self
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        merged = []
+        seen = 0
+        mean, weight = points[0]
+        for value, value_weight in points[1:]:
+            q = (seen + weight + value_weight / 2) / self.count
+            limit = 4 * self.count * q * (1 - q) / self.compression
+            if weight + value_weight <= max(limit, 1):
+                weight += value_weight
+                mean += (value - mean) * value_weight / weight
+            else:
+                merged.append((mean, weight))
+                seen += weight
+                mean, weight = value, value_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+
+    def quantile(self, q):
+        self._compress()
+        if not self.centroids:
+            return None
+        target = q * self.count
+        seen = 0
+        previous = None
+        for mean, weight in self.centroids:
+            center = seen + weight / 2
+            if target <= center:
+                if previous is None:
+                    return self.min + (mean - self.min) * target / center
+                prev_mean, prev_center = previous
+                fraction = (target - prev_center) / (center - prev_center)
+                return prev_mean + (mean - prev_mean) * fraction
+            previous = (mean, center)
+            seen += weight
+        prev_mean, prev_center = previous
+        fraction = (target - prev_center) / (self.count - prev_center)
+        return prev_mean + (self.max - prev_mean) * fraction
+
+
+def summarize(values, quantiles=(0.5, 0.9, 0.99), bin_width=10, compression=100):
+    """
+    Single pass over any iterable of numbers (e.g. stream_user_ages()).
+    Memory stays constant regardless of how many values are streamed.
+    """
+    stats = RunningStats()
+    histogram = Histogram(bin_width)
+    digest = TDigest(compression)
+    for value in values:
+        stats.push(value)
+        histogram.push(value)
+        digest.push(value)
+    return {
+        'count': stats.count,
+        'mean': stats.mean if stats.count else None,
+        'min': stats.min,
+        'max': stats.max,
+        'variance': stats.variance,
+        'stddev': stats.stddev,
+        'quantiles': {q: digest.quantile(q) for q in quantiles},
+        'histogram': dict(sorted(histogram.bins.items())),
+    }
+
+def summarize_sql(connection, column='age', where=None, quantiles=(0.5, 0.9, 0.99),
+                  bin_width=10):
+    """
+    Same summary as summarize, with MySQL doing the scan.
+    Meant for columns with few distinct values (like age): a single
+    GROUP BY query returns the count of each value, and the moments,
+    exact (nearest rank) quantiles and histogram are derived from those
+    counts. With an index on the column the GROUP BY is an index scan.
+    """
+    query.compile_columns([column])
+    where_sql, params = query.compile_where(where)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"SELECT {column}, COUNT(*) FROM user_data{where_sql} "
+            f"{'AND' if where_sql else 'WHERE'} {column} IS NOT NULL "
+            f"GROUP BY {column} ORDER BY {column}",
+            params
+        )
+        frequencies = [(float(value), n) for value, n in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+    count = sum(n for _, n in frequencies)
+    if not count:
+        return {
+            'count': 0, 'mean': None, 'min': None, 'max': None,
+            'variance': None, 'stddev': None,
+            'quantiles': {q: None for q in quantiles}, 'histogram': {},
+        }
+
+    mean = sum(value * n for value, n in frequencies) / count
+    variance = sum(n * (value - mean) ** 2 for value, n in frequencies) / count
+
+    # Nearest rank: the value at 0-based position int(q * count) in sorted order
+    ranks = sorted((min(count - 1, int(q * count)), q) for q in quantiles)
+    results = {}
+    seen = 0
+    position = 0
+    for value, n in frequencies:
+        seen += n
+        while position < len(ranks) and ranks[position][0] < seen:
+            results[ranks[position][1]] = value
+            position += 1
+
+    histogram = {}
+    for value, n in frequencies:
+        start = float(math.floor(value / bin_width) * bin_width)
+        histogram[start] = histogram.get(start, 0) + n
+
+    return {
+        'count': count,
+        'mean': mean,
+        'min': frequencies[0][0],
+        'max': frequencies[-1][0],
+        'variance': variance,
+        'stddev': math.sqrt(variance),
+        'quantiles': {q: results[q] for q in quantiles},
+        'histogram': histogram,
+    }
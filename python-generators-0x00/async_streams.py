@@ -0,0 +1,190 @@
+"""async for versions of the user_data streaming readers"""
+import os
+import re
+import asyncio
+import sqlite3
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import aiomysql
+except ImportError:  # aiomysql is optional, see ThreadedConnection
+    aiomysql = None
+pool = __import__('pool')
+query = __import__('query')
+rows = __import__('rows')
+lazy_paginate = __import__('2-lazy_paginate')
+
+
+class ThreadedCursor:
+    """Async cursor that runs a DB-API cursor on its connection's thread"""
+
+    def __init__(self, connection, cursor):
+        self._connection = connection
+        self._cursor = cursor
+
+    async def execute(self, sql, params=()):
+        await self._connection.run(self._cursor.execute, self._connection.translate(sql), params)
+
+    async def fetchone(self):
+        return await self._connection.run(self._cursor.fetchone)
+
+    async def fetchmany(self, size):
+        return await self._connection.run(self._cursor.fetchmany, size)
+
+    async def fetchall(self):
+        return await self._connection.run(self._cursor.fetchall)
+
+    async def close(self):
+        # Drains what an early exit left unread, like the sync readers
+        await self._connection.run(pool.close_cursor, self._connection._conn, self._cursor)
+
+
+class ThreadedConnection:
+    """
+    Local stand-in for an async driver connection.
+    Wraps a blocking DB-API connection and runs every call on one
+    dedicated thread, so the event loop never blocks on it.
+    """
+
+    def __init__(self, connect, release=None, paramstyle='format'):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._conn = self._executor.submit(connect).result()
+        self._release = release
+        self._paramstyle = paramstyle
+
+    def translate(self, sql):
+        if self._paramstyle == 'qmark':
+            return re.sub(r"%s", "?", sql)
+        return sql
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def cursor(self):
+        return ThreadedCursor(self, await self.run(self._conn.cursor))
+
+    def close(self):
+        # Queued on the connection thread; does not wait, like aiomysql's close()
+        if self._release:
+            self._executor.submit(self._release, self._conn)
+        else:
+            self._executor.submit(self._conn.close)
+        self._executor.shutdown(wait=False)
+
+
+async def connect():
+    """
+    Default async connection: aiomysql when installed, otherwise a
+    ThreadedConnection over a connection borrowed from the shared pool.
+    """
+    if aiomysql is not None:
+        return await aiomysql.connect(
+            host=os.environ.get("MY_DB_HOST", "localhost"),
+            user=os.environ.get("MY_DB_USER", "root"),
+            password=os.environ.get("MY_DB_PASSWORD", ""),
+            db="ALX_prodev"
+        )
+    shared = pool.get_pool()
+    return await asyncio.to_thread(ThreadedConnection, shared.acquire, shared.release)
+
+def sqlite_connect(path):
+    """Connection factory for tests: a ThreadedConnection over SQLite"""
+    async def connect_sqlite():
+        return await asyncio.to_thread(
+            ThreadedConnection, lambda: sqlite3.connect(path), None, 'qmark'
+        )
+    return connect_sqlite
+
+async def _open_cursor(conn):
+    if aiomysql is not None and isinstance(conn, aiomysql.Connection):
+        # Unbuffered cursor so rows stream instead of being loaded up front
+        return await conn.cursor(aiomysql.SSCursor)
+    return await conn.cursor()
+
+async def _prefetched(fetch):
+    """
+    Yields await fetch() results until one is empty, keeping the next
+    fetch in flight while the consumer works on the current result.
+    Use it under contextlib.aclosing so an early exit waits for the
+    in-flight fetch before the caller closes its cursor.
+    """
+    pending = asyncio.ensure_future(fetch())
+    try:
+        while True:
+            result = await pending
+            if not result:
+                return
+            pending = asyncio.ensure_future(fetch())
+            yield result
+    finally:
+        if not pending.done():
+            pending.cancel()
+        try:
+            await pending
+        except (asyncio.CancelledError, Exception):
+            pass  # the consumer has already stopped reading
+
+async def astream_users_in_batches(batch_size, where=None, columns=None, connect=connect,
+                                   as_rows=False):
+    """
+    Async generator that yields batches (lists of dictionaries, or
+    rows.UserRow with as_rows=True) of user_data from one streamed query;
+    the next batch is prefetched.
+    """
+    sql, params, names = query.build_select(columns, where)
+    make_row = rows.row_factory(names, as_rows)
+    conn = await connect()
+    try:
+        cursor = await _open_cursor(conn)
+        try:
+            await cursor.execute(sql, params)
+            async with contextlib.aclosing(_prefetched(lambda: cursor.fetchmany(batch_size))) as batches:
+                async for fetched in batches:
+                    yield [make_row(row) for row in fetched]
+        finally:
+            await cursor.close()
+    finally:
+        conn.close()
+
+async def astream_users(batch_size=1000, connect=connect):
+    """Async generator that yields each row from 'user_data' as a UserRow"""
+    async for batch in astream_users_in_batches(batch_size, connect=connect, as_rows=True):
+        for row in batch:
+            yield row
+
+async def alazy_paginate(page_size, page_cursor=None, connect=connect, as_rows=False):
+    """
+    Async generator of user_data pages read with keyset pagination (see
+    paginate_users_after); the next page is prefetched.
+    """
+    conn = await connect()
+    state = {'cursor': page_cursor, 'done': False}
+
+    async def fetch_page():
+        if state['done']:
+            return []
+        where = None
+        if state['cursor'] is not None:
+            where = {'user_id__gt': lazy_paginate.decode_cursor(state['cursor'])}
+        sql, params, names = query.build_select(where=where)
+        cursor = await _open_cursor(conn)
+        try:
+            await cursor.execute(sql + query.ORDER_BY_KEY + " LIMIT %s", (*params, page_size))
+            fetched = await cursor.fetchall()
+        finally:
+            await cursor.close()
+        if len(fetched) == page_size:
+            last_user_id = fetched[-1][names.index('user_id')]
+            state['cursor'] = lazy_paginate.encode_cursor(last_user_id)
+        else:
+            state['done'] = True
+        make_row = rows.row_factory(names, as_rows)
+        return [make_row(row) for row in fetched]
+
+    try:
+        async with contextlib.aclosing(_prefetched(fetch_page)) as pages:
+            async for page in pages:
+                yield page
+    finally:
+        conn.close()
@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+"""
+Benchmark harness for the user_data streaming readers.
+
+Seeds user_data (MySQL, or a SQLite stand-in) at each size through
+seed.py, then runs every reader/batch size in a fresh process and reports
+rows/sec, time to first row, peak RSS and query count as JSON.
+
+    python3 benchmark.py --backend sqlite --sizes 10000,1000000 --output bench.json
+"""
+import os
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+seed = __import__('seed')
+pool = __import__('pool')
+sqlite_standin = __import__('sqlite_standin')
+
+DEFAULT_SIZES = '10000,1000000,10000000'
+DEFAULT_BATCH_SIZES = '100,1000,10000'
+
+query_count = 0
+
+
+class CountingCursor:
+    """Cursor proxy counting every execute/executemany"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        global query_count
+        query_count += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        global query_count
+        query_count += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """Connection proxy whose cursors count queries"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _flatten(batches):
+    for batch in batches:
+        yield from batch
+
+def readers():
+    """Reader name -> (function of batch_size returning a row iterator, uses batch_size)"""
+    stream_users = __import__('0-stream_users').stream_users
+    stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+    lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+    stream_user_ages = __import__('4-stream_ages').stream_user_ages
+    return {
+        'stream_users': (lambda size: stream_users(), False),
+        'stream_users_in_batches': (
+            lambda size: _flatten(stream_users_in_batches(size)), True),
+        'stream_users_in_batches[server_side]': (
+            lambda size: _flatten(stream_users_in_batches(size, server_side=True)), True),
+        'lazy_paginate': (lambda size: _flatten(lazy_paginate(size)), True),
+        'lazy_paginate[keyset]': (
+            lambda size: _flatten(lazy_paginate(size, keyset=True)), True),
+        'stream_user_ages': (lambda size: stream_user_ages(), False),
+    }
+
+def connect_factory(backend, db_path):
+    """Connection factory for the backend (db_path is only used for sqlite)"""
+    if backend == 'sqlite':
+        return lambda: sqlite_standin.connect(db_path)
+    return seed.connect_to_prodev
+
+def write_csv(path, rows, random_seed=42):
+    """Write a deterministic user_data.csv-style file with rows users"""
+    rng = random.Random(random_seed)
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+        writer.writerow(['name', 'email', 'age'])
+        for i in range(rows):
+            writer.writerow([f"User {i}", f"user{i}@example.com", rng.randint(1, 120)])
+
+def prepare(backend, rows, workdir):
+    """Seed user_data with exactly rows users; returns the sqlite db path (or None)"""
+    csv_path = os.path.join(workdir, f"users_{rows}.csv")
+    if not os.path.exists(csv_path):
+        write_csv(csv_path, rows)
+
+    if backend == 'sqlite':
+        db_path = os.path.join(workdir, f"users_{rows}.sqlite")
+        connection = sqlite_standin.connect(db_path)
+    else:
+        db_path = None
+        server = seed.connect_db()
+        seed.create_database(server)
+        server.close()
+        connection = seed.connect_to_prodev()
+
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    if existing != rows:
+        cursor.execute("DELETE FROM user_data")
+        connection.commit()
+        seed.insert_data(connection, csv_path, chunk_size=10000, report_every=0)
+    cursor.close()
+    connection.close()
+    return db_path
+
+def run_one(backend, db_path, reader, batch_size):
+    """Measure one reader in the current process"""
+    base_connect = connect_factory(backend, db_path)
+    pool.get_pool(connect=lambda: CountingConnection(base_connect()))
+    make_rows, _ = readers()[reader]
+
+    rows = 0
+    first_row = None
+    started = time.perf_counter()
+    for _ in make_rows(batch_size):
+        if first_row is None:
+            first_row = time.perf_counter() - started
+        rows += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'reader': reader,
+        'batch_size': batch_size,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else None,
+        'time_to_first_row': first_row,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'queries': query_count,
+    }
+
+def run_isolated(backend, db_path, reader, batch_size):
+    """run_one in a fresh interpreter so peak RSS is per reader"""
+    args = json.dumps([backend, db_path, reader, batch_size])
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', args],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run(backend, sizes, batch_sizes, workdir, selected=None):
+    """Run the whole matrix and return the JSON-serializable report"""
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    for rows in sizes:
+        db_path = prepare(backend, rows, workdir)
+        for reader, (_, batched) in readers().items():
+            if selected and reader not in selected:
+                continue
+            for batch_size in (batch_sizes if batched else [None]):
+                result = run_isolated(backend, db_path, reader, batch_size)
+                result['table_rows'] = rows
+                results.append(result)
+                print(f"{rows:>9} {reader:<38} {str(batch_size):>6} "
+                      f"{result['rows_per_sec'] or 0:>12.0f} rows/s", file=sys.stderr)
+    return {
+        'backend': backend,
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES)
+    parser.add_argument('--batch-sizes', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--readers', help="comma separated subset of readers")
+    parser.add_argument('--workdir', default='bench_data')
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_one(*json.loads(args.child))))
+        return
+
+    report = run(
+        args.backend,
+        [int(n) for n in args.sizes.split(',')],
+        [int(n) for n in args.batch_sizes.split(',')],
+        args.workdir,
+        args.readers.split(',') if args.readers else None,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Struct-of-arrays batches of user_data rows backed by NumPy"""
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only needed for columnar batches
+    np = None
+
+def to_columns(names, rows):
+    """
+    Turns row tuples into {column: array}.
+    age becomes an int16 array; text columns become compact UTF-8 byte
+    string arrays (decode with .astype(str) or .decode() when needed).
+    """
+    if np is None:
+        raise ImportError("columnar batches require numpy")
+    values_by_column = list(zip(*rows)) if rows else [() for _ in names]
+    batch = {}
+    for name, values in zip(names, values_by_column):
+        if name == 'age':
+            batch[name] = np.fromiter(
+                (int(value) for value in values), dtype=np.int16, count=len(values)
+            )
+        else:
+            batch[name] = np.array(
+                [str(value).encode() for value in values], dtype=np.bytes_
+            )
+    return batch
+
+def batch_length(batch):
+    """Number of rows in a columnar batch"""
+    return len(next(iter(batch.values()))) if batch else 0
+
+def filter_batch(batch, mask):
+    """Keeps the rows where mask is true, e.g. filter_batch(b, b['age'] > 25)"""
+    return {name: values[mask] for name, values in batch.items()}
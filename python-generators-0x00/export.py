@@ -0,0 +1,156 @@
+"""Export user_data to chunked Parquet, Arrow IPC or NDJSON files"""
+import os
+import bz2
+import gzip
+import json
+import lzma
+import functools
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, only needed for parquet/arrow
+    pa = None
+pool = __import__('pool')
+query = __import__('query')
+parallel_scan = __import__('parallel_scan')
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'ndjson': '.ndjson'}
+
+NDJSON_OPENERS = {
+    None: (open, ''),
+    'gzip': (gzip.open, '.gz'),
+    'bz2': (bz2.open, '.bz2'),
+    'xz': (lzma.open, '.xz'),
+}
+
+def iter_column_batches(key_range=(None, None), columns=None, where=None,
+                        batch_size=10000):
+    """
+    Generator of (names, column_lists) batches for one key range, ordered
+    by user_id. Rows are transposed with zip(*rows) instead of being
+    turned into per-row dicts.
+    """
+    sql, params, names = query.build_select(
+        columns, parallel_scan.range_where(key_range, where)
+    )
+    with pool.connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql + query.ORDER_BY_KEY, params)
+            for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+                values = [list(column) for column in zip(*rows)]
+                if 'age' in names:
+                    i = names.index('age')
+                    values[i] = [int(age) for age in values[i]]
+                yield names, values
+        finally:
+            pool.close_cursor(conn, cursor)
+
+def arrow_schema(names):
+    """Arrow schema for the selected user_data columns"""
+    types = {'age': pa.int16()}
+    return pa.schema([(name, types.get(name, pa.string())) for name in names])
+
+def _write_arrow(path, fmt, names, batches, compression, row_group_size):
+    """
+    Writes batches as Parquet or Arrow IPC in row groups of exactly
+    row_group_size rows (the last may be shorter), buffering at most one
+    row group. The file is created even when there are no rows.
+    """
+    schema = arrow_schema(names)
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(path, schema, compression=compression or 'none')
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        writer = pa.ipc.new_file(path, schema, options=options)
+    pending = []
+    pending_rows = 0
+    total = 0
+
+    def write(table):
+        if fmt == 'parquet':
+            writer.write_table(table, row_group_size=row_group_size)
+        else:
+            # IPC batches follow the table's chunks; merge the fetch batches
+            writer.write_table(table.combine_chunks(), max_chunksize=row_group_size)
+
+    try:
+        for _, values in batches:
+            pending.append(pa.record_batch(values, schema=schema))
+            pending_rows += len(values[0])
+            total += len(values[0])
+            if pending_rows >= row_group_size:
+                # Write whole row groups; the remainder starts the next one
+                table = pa.Table.from_batches(pending, schema=schema)
+                full = pending_rows - pending_rows % row_group_size
+                write(table.slice(0, full))
+                rest = table.slice(full)
+                pending = rest.to_batches()
+                pending_rows = rest.num_rows
+        if pending_rows:
+            write(pa.Table.from_batches(pending, schema=schema))
+    finally:
+        writer.close()
+    return total
+
+def _write_ndjson(path, batches, compression):
+    """Writes one JSON object per line, optionally compressed"""
+    opener, _ = NDJSON_OPENERS[compression]
+    total = 0
+    with opener(path, 'wt', encoding='utf-8') as file:
+        for names, values in batches:
+            file.writelines(
+                json.dumps(dict(zip(names, row))) + '\n' for row in zip(*values)
+            )
+            total += len(values[0])
+    return total
+
+def output_path(path, fmt, compression=None):
+    """path with the extension of the format (and ndjson compression)"""
+    if not path.endswith(FORMATS[fmt]):
+        path += FORMATS[fmt]
+    if fmt == 'ndjson':
+        path += NDJSON_OPENERS[compression][1]
+    return path
+
+def export_users(path, fmt='parquet', compression=None, row_group_size=100000,
+                 batch_size=10000, columns=None, where=None, key_range=(None, None)):
+    """
+    Streams user_data (or one key range of it) into a single file.
+    fmt is 'parquet', 'arrow' (IPC file) or 'ndjson'. compression is a
+    Parquet codec ('snappy', 'zstd', ...), an IPC codec ('lz4', 'zstd') or
+    'gzip'/'bz2'/'xz' for NDJSON. Memory stays bounded by row_group_size.
+    Returns (path, rows_written).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt != 'ndjson' and pa is None:
+        raise ImportError(f"{fmt} export requires pyarrow")
+
+    path = output_path(path, fmt, compression)
+    batches = iter_column_batches(key_range, columns, where, batch_size)
+    if fmt == 'ndjson':
+        rows = _write_ndjson(path, batches, compression)
+    else:
+        names = query.build_select(columns, where)[2]
+        rows = _write_arrow(path, fmt, names, batches, compression, row_group_size)
+    return path, rows
+
+def export_users_parallel(directory, workers=None, fmt='parquet', **options):
+    """
+    Exports user_data as one part file per key range, written by a pool of
+    worker processes (part-00000, part-00001, ...).
+    Returns a list of (path, rows_written).
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+    ranges = parallel_scan.key_ranges(workers)
+    paths = [os.path.join(directory, f"part-{i:05d}") for i in range(len(ranges))]
+    task = functools.partial(_export_part, fmt, options)
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(task, paths, ranges))
+
+def _export_part(fmt, options, path, key_range):
+    """Process entry point for export_users_parallel"""
+    return export_users(path, fmt, key_range=key_range, **options)
@@ -0,0 +1,161 @@
+"""Parallel scans of user_data, split into user_id key ranges across processes"""
+import os
+import uuid
+import queue
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+pool = __import__('pool')
+query = __import__('query')
+rows = __import__('rows')
+
+def key_ranges(n):
+    """
+    Split the user_id (UUID) keyspace into n contiguous ranges.
+    Returns a list of (low, high) pairs; None means unbounded.
+    """
+    bounds = [str(uuid.UUID(int=i * (1 << 128) // n)) for i in range(1, n)]
+    bounds = [None] + bounds + [None]
+    return list(zip(bounds, bounds[1:]))
+
+def range_where(key_range, where=None):
+    """Adds the bounds of key_range to a where dict (see query.compile_where)"""
+    low, high = key_range
+    where = dict(where or {})
+    if low is not None:
+        where['user_id__gte'] = low
+    if high is not None:
+        where['user_id__lt'] = high
+    return where
+
+def scan_range(key_range, columns=None, where=None, batch_size=1000, as_rows=False):
+    """
+    Generator that streams the batches of one key range, ordered by
+    user_id, on a pooled connection (each worker process has its own pool).
+    Batches hold dicts, or rows.UserRow with as_rows=True.
+    """
+    sql, params, names = query.build_select(columns, range_where(key_range, where))
+    make_row = rows.row_factory(names, as_rows)
+
+    with pool.connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql + query.ORDER_BY_KEY, params)
+            for fetched in iter(lambda: cursor.fetchmany(batch_size), []):
+                yield [make_row(row) for row in fetched]
+        finally:
+            pool.close_cursor(conn, cursor)
+
+def _scan_worker(index, key_range, columns, where, batch_size, as_rows, out_queue):
+    """Process entry point: push (index, batch) items, then (index, None)"""
+    try:
+        for batch in scan_range(key_range, columns, where, batch_size, as_rows):
+            out_queue.put((index, batch))
+        out_queue.put((index, None))
+    except Exception as e:
+        out_queue.put((index, e))
+
+def _get(out_queue, processes, waiting_for, poll_interval):
+    """
+    out_queue.get() that raises RuntimeError instead of blocking forever
+    when a worker in waiting_for has died without sending its sentinel
+    (killed, crashed, or failed to pickle its exception).
+    """
+    while True:
+        # Checked before the get: a worker that has exited has flushed
+        # everything it sent, so an empty queue after that means it is lost
+        dead = [i for i in waiting_for if not processes[i].is_alive()]
+        try:
+            return out_queue.get(timeout=poll_interval)
+        except queue.Empty:
+            if dead:
+                raise RuntimeError(
+                    f"scan worker {dead[0]} exited with code "
+                    f"{processes[dead[0]].exitcode} before finishing its range"
+                )
+
+def parallel_scan(workers=None, ordered=False, columns=None, where=None,
+                  batch_size=1000, queue_size=4, as_rows=False, poll_interval=1.0):
+    """
+    Generator that streams user_data rows read by one process per key range.
+    Unordered mode yields rows as soon as any worker delivers a batch.
+    Ordered mode yields rows by user_id; later ranges wait in bounded
+    queues (queue_size batches each) until their turn.
+    Workers are checked every poll_interval seconds while waiting, and
+    RuntimeError is raised if one died without finishing.
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = key_ranges(workers)
+    if ordered:
+        queues = [multiprocessing.Queue(queue_size) for _ in ranges]
+    else:
+        queues = [multiprocessing.Queue(queue_size * workers)] * workers
+
+    processes = [
+        multiprocessing.Process(
+            target=_scan_worker,
+            args=(i, key_range, columns, where, batch_size, as_rows, queues[i]),
+            daemon=True
+        )
+        for i, key_range in enumerate(ranges)
+    ]
+    for process in processes:
+        process.start()
+
+    # Ordered mode drains one range queue at a time; unordered mode drains
+    # the single shared queue until every worker has finished.
+    readers = ([(q, {i}) for i, q in enumerate(queues)] if ordered
+               else [(queues[0], set(range(workers)))])
+    try:
+        for out_queue, remaining in readers:
+            while remaining:
+                index, batch = _get(out_queue, processes, remaining, poll_interval)
+                if batch is None:
+                    remaining.discard(index)
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    yield from batch
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+def _map_range(mapper, columns, where, batch_size, key_range):
+    """Process entry point: apply mapper to the rows of one key range"""
+    rows = (row for batch in scan_range(key_range, columns, where, batch_size)
+            for row in batch)
+    return mapper(rows)
+
+def parallel_map_reduce(mapper, reducer, workers=None, columns=None, where=None,
+                        batch_size=1000):
+    """
+    Runs mapper(rows) over every key range in a process pool and folds the
+    partial results with reducer(a, b).
+    mapper and reducer must be module-level functions (picklable).
+    """
+    workers = workers or os.cpu_count() or 1
+    task = functools.partial(_map_range, mapper, columns, where, batch_size)
+    with ProcessPoolExecutor(workers) as pool:
+        return functools.reduce(reducer, pool.map(task, key_ranges(workers)))
+
+def _sum_count_ages(rows):
+    total = 0
+    count = 0
+    for row in rows:
+        total += row['age']
+        count += 1
+    return total, count
+
+def _add_pairs(a, b):
+    return a[0] + b[0], a[1] + b[1]
+
+def parallel_average_age(workers=None):
+    """calculate_average_age, with each key range summed by its own process"""
+    total, count = parallel_map_reduce(
+        _sum_count_ages, _add_pairs, workers, columns=['age']
+    )
+    if count == 0:
+        return 0
+    return int(total // count)
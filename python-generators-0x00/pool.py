@@ -0,0 +1,179 @@
+"""Shared pool of ALX_prodev connections for the user_data generators"""
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+seed = __import__('seed')
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+    Connections idle for more than health_check_after seconds are
+    health-checked (a ping round trip) before reuse, and recycled once
+    they are older than recycle seconds. Checkout wait times are tracked
+    in metrics.
+    """
+
+    def __init__(self, connect=None, size=5, recycle=3600, timeout=30,
+                 health_check=True, health_check_after=30):
+        self._connect = connect or seed.connect_to_prodev
+        self.size = size
+        self.recycle = recycle
+        self.timeout = timeout
+        self.health_check = health_check
+        self.health_check_after = health_check_after
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._created = {}
+        self._idle_since = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            'checkouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'failed_health_checks': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    def acquire(self):
+        """Check out a connection, waiting up to timeout for a free slot"""
+        if self._pid != os.getpid():
+            # Connections inherited through fork are not safe to share
+            self._reset()
+
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No connection available after {self.timeout}s")
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.metrics['checkouts'] += 1
+            self.metrics['wait_seconds_total'] += waited
+            self.metrics['wait_seconds_max'] = max(self.metrics['wait_seconds_max'], waited)
+
+        try:
+            return self._checkout()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if self.recycle and time.monotonic() - self._created[id(conn)] > self.recycle:
+                self._discard(conn, 'connections_recycled')
+            elif self._needs_check(conn) and not self._is_healthy(conn):
+                self._discard(conn, 'failed_health_checks')
+            else:
+                return conn
+
+    def _open(self):
+        conn = self._connect()
+        if conn is None:
+            raise ConnectionError("Could not connect to the database")
+        with self._lock:
+            self._created[id(conn)] = time.monotonic()
+            self.metrics['connections_created'] += 1
+        return conn
+
+    def _needs_check(self, conn):
+        if not self.health_check:
+            return False
+        with self._lock:
+            idle_since = self._idle_since.pop(id(conn), None)
+        return idle_since is None or time.monotonic() - idle_since > self.health_check_after
+
+    def _is_healthy(self, conn):
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _discard(self, conn, metric=None):
+        with self._lock:
+            self._created.pop(id(conn), None)
+            self._idle_since.pop(id(conn), None)
+            if metric:
+                self.metrics[metric] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn):
+        """Return a connection; ones left with unread results are closed"""
+        if self._pid != os.getpid():
+            return
+        if getattr(conn, 'unread_result', False):
+            self._discard(conn)
+        else:
+            with self._lock:
+                self._idle_since[id(conn)] = time.monotonic()
+            self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ..."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Snapshot of the pool metrics, including the mean checkout wait"""
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['idle'] = self._idle.qsize()
+        stats['wait_seconds_avg'] = (
+            stats['wait_seconds_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        )
+        return stats
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name='prodev', connect=None, **options):
+    """
+    Process-wide pool registry; the first call for a name creates it.
+    The default pool size comes from MY_DB_POOL_SIZE (5 if unset).
+    """
+    with _pools_lock:
+        if name not in _pools:
+            options.setdefault('size', int(os.environ.get("MY_DB_POOL_SIZE", 5)))
+            _pools[name] = ConnectionPool(connect, **options)
+        return _pools[name]
+
+@contextmanager
+def connection(name='prodev'):
+    """Borrow a connection from the named pool"""
+    with get_pool(name).connection() as conn:
+        yield conn
+
+def close_cursor(conn, cursor):
+    """
+    Close a cursor, first reading off whatever an early exit left of an
+    unbuffered result: mysql.connector refuses to close the cursor
+    ("Unread result found") and the pool would drop the connection.
+    """
+    if getattr(conn, 'unread_result', False):
+        conn.consume_results()
+    cursor.close()
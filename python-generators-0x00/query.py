@@ -0,0 +1,112 @@
+"""Compiles declarative filters and projections on user_data into SQL"""
+import os
+
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+
+# Layout of the user_data table (see seed.create_table):
+# 1 - CHAR(36) user_id, DECIMAL age, no secondary indexes
+# 2 - BINARY(16) user_id, TINYINT UNSIGNED age, unique email and age indexes
+# Set MY_DB_SCHEMA=2 once seed.migrate_user_data has run.
+SCHEMA_VERSION = int(os.environ.get("MY_DB_SCHEMA", 1))
+
+# Qualified so MySQL orders by the primary key, not by a select-list alias
+ORDER_BY_KEY = " ORDER BY user_data.user_id"
+
+def key_to_text(expr, version=None):
+    """SQL turning a stored user_id into its UUID text form"""
+    if (version or SCHEMA_VERSION) >= 2:
+        return f"BIN_TO_UUID({expr})"
+    return expr
+
+def key_from_text(expr, version=None):
+    """SQL turning a UUID text value into the stored user_id form"""
+    if (version or SCHEMA_VERSION) >= 2:
+        return f"UUID_TO_BIN({expr})"
+    return expr
+
+def select_expression(column, version=None):
+    """
+    Select-list entry for a column. Keys are returned as UUID text; a
+    DECIMAL age (schema 1) is cast so the driver returns plain ints
+    instead of Decimal objects.
+    """
+    version = version or SCHEMA_VERSION
+    if column == 'user_id' and version >= 2:
+        return f"{key_to_text('user_id', version)} AS user_id"
+    if column == 'age' and version < 2:
+        return "CAST(age AS UNSIGNED) AS age"
+    return column
+
+def placeholder(column, version=None):
+    """Parameter placeholder for a value compared with column"""
+    if column == 'user_id':
+        return key_from_text('%s', version)
+    return '%s'
+
+OPERATORS = {
+    'eq': '=',
+    'ne': '<>',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'in': 'IN',
+    'like': 'LIKE',
+}
+
+def compile_columns(columns=None):
+    """
+    Validates a projection against the user_data columns.
+    Returns the list of selected column names (all columns by default).
+    """
+    if not columns:
+        return list(USER_COLUMNS)
+    for column in columns:
+        if column not in USER_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+    return list(columns)
+
+def compile_where(where=None):
+    """
+    Compiles {"<column>__<op>": value} predicates into a parameterized
+    WHERE clause, e.g. {"age__gt": 25} -> (" WHERE age > %s", [25]).
+    A key without an operator suffix means equality.
+    """
+    if not where:
+        return "", []
+
+    clauses = []
+    params = []
+    for key, value in where.items():
+        column, _, op = key.partition('__')
+        op = op or 'eq'
+        if column not in USER_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+
+        if op == 'in':
+            values = list(value)
+            if not values:
+                # Nothing can match an empty IN list
+                clauses.append("1 = 0")
+                continue
+            placeholders = ", ".join([placeholder(column)] * len(values))
+            clauses.append(f"{column} IN ({placeholders})")
+            params.extend(values)
+        else:
+            clauses.append(f"{column} {OPERATORS[op]} {placeholder(column)}")
+            params.append(value)
+
+    return " WHERE " + " AND ".join(clauses), params
+
+def build_select(columns=None, where=None, table='user_data'):
+    """
+    Builds a SELECT for the given projection and predicates.
+    Returns (sql, params, column_names).
+    """
+    names = compile_columns(columns)
+    where_sql, params = compile_where(where)
+    select_list = ', '.join(select_expression(name) for name in names)
+    sql = f"SELECT {select_list} FROM {table}{where_sql}"
+    return sql, params, names
@@ -0,0 +1,24 @@
+"""Compact, typed rows for user_data"""
+from typing import NamedTuple
+query = __import__('query')
+
+class UserRow(NamedTuple):
+    """
+    One user_data row. A tuple subclass without a per-instance __dict__,
+    so it is a fraction of the size of the equivalent dict.
+    """
+    user_id: str
+    name: str
+    email: str
+    age: int
+
+def row_factory(names, as_rows=False):
+    """
+    Function converting a fetched row tuple into a UserRow (which needs
+    every user_data column, in order) or a dict keyed by names
+    """
+    if as_rows:
+        if tuple(names) != query.USER_COLUMNS:
+            raise ValueError("UserRow rows need all user_data columns")
+        return UserRow._make
+    return lambda row: dict(zip(names, row))
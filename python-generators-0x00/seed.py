@@ -1,6 +1,10 @@
 import os
+import csv
+import time
+import itertools
 import uuid
 import mysql.connector
+query = __import__('query')
 
 def connect_db():
     """Connect to MySQL server"""
@@ -22,49 +26,336 @@ def create_database(connection):
     connection.commit()
     cursor.close()
 
-def connect_to_prodev():
+def connect_to_prodev(allow_local_infile=False):
     """Connect to ALX_prodev database"""
     try:
         mydb = mysql.connector.connect(
             host=os.environ.get("MY_DB_HOST", "localhost"),
             user=os.environ.get("MY_DB_USER", "root"),
             password=os.environ.get("MY_DB_PASSWORD", ""),
-            database="ALX_prodev"
+            database="ALX_prodev",
+            allow_local_infile=allow_local_infile
         )
         return mydb
     except mysql.connector.Error as err:
         print(f"Error connecting to ALX_prodev: {err}")
         return None
 
-def create_table(connection):
-    """Create user_data table"""
-    cursor = connection.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_data (
+USER_DATA_DDL = {
+    1: """
+        CREATE TABLE IF NOT EXISTS {table} (
             user_id CHAR(36) PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
             email VARCHAR(255) NOT NULL,
             age DECIMAL NOT NULL
         )
+    """,
+    # 16-byte key (shrinks the clustered index and every secondary index
+    # entry), unique email lookups, and an age index that also covers
+    # "SELECT age" and age range filters
+    2: """
+        CREATE TABLE IF NOT EXISTS {table} (
+            user_id BINARY(16) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age TINYINT UNSIGNED NOT NULL,
+            UNIQUE KEY idx_user_data_email (email),
+            KEY idx_user_data_age (age)
+        )
+    """,
+}
+
+def create_table(connection, version=None):
+    """Create user_data table (layout from query.SCHEMA_VERSION by default)"""
+    cursor = connection.cursor()
+    cursor.execute(USER_DATA_DDL[version or query.SCHEMA_VERSION].format(table='user_data'))
+    connection.commit()
+    cursor.close()
+
+def migrate_user_data(connection, chunk_size=10000):
+    """
+    Online migration of a schema 1 user_data table to schema 2.
+    Rows are copied into a shadow table in primary-key chunks (one commit
+    per chunk) while triggers mirror concurrent writes into it, then the
+    two tables are swapped with an atomic RENAME. The old table is kept
+    as user_data_v1. Set MY_DB_SCHEMA=2 for the readers afterwards.
+    If the copy fails the triggers and the shadow table are removed and
+    user_data is left as it was.
+    Returns the number of rows copied.
+    """
+    cursor = connection.cursor()
+    swapped = False
+    try:
+        cursor.execute(
+            "SELECT DATA_TYPE, CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data' "
+            "AND COLUMN_NAME = 'user_id'"
+        )
+        row = cursor.fetchone()
+        if row is None or (row[0].lower(), row[1]) != ('char', 36):
+            raise ValueError("user_data is not a schema 1 table (CHAR(36) user_id)")
+        cursor.execute("SHOW TABLES LIKE 'user_data_v1'")
+        if cursor.fetchone():
+            raise ValueError("user_data_v1 already exists; drop or rename it first")
+
+        cursor.execute(
+            "SELECT COUNT(*) FROM (SELECT email FROM user_data "
+            "GROUP BY email HAVING COUNT(*) > 1) duplicates"
+        )
+        if cursor.fetchone()[0]:
+            raise ValueError("user_data has duplicate emails; cannot add a unique email index")
+        cursor.execute("SELECT MIN(age), MAX(age) FROM user_data")
+        low, high = cursor.fetchone()
+        if low is not None and (low < 0 or high > 255):
+            raise ValueError("user_data has ages outside TINYINT UNSIGNED (0-255)")
+
+        cursor.execute("DROP TABLE IF EXISTS user_data_v2")
+        cursor.execute(USER_DATA_DDL[2].format(table='user_data_v2'))
+
+        # Mirror writes made while the copy runs
+        copy_new = ("REPLACE INTO user_data_v2 (user_id, name, email, age) "
+                    "VALUES (UUID_TO_BIN(NEW.user_id), NEW.name, NEW.email, NEW.age)")
+        delete_old = "DELETE FROM user_data_v2 WHERE user_id = UUID_TO_BIN(OLD.user_id)"
+        for op, event, body in (('insert', 'INSERT', f"{copy_new};"),
+                                ('update', 'UPDATE', f"{delete_old}; {copy_new};"),
+                                ('delete', 'DELETE', f"{delete_old};")):
+            cursor.execute(f"DROP TRIGGER IF EXISTS user_data_migrate_{op}")
+            cursor.execute(f"""
+                CREATE TRIGGER user_data_migrate_{op} AFTER {event} ON user_data
+                FOR EACH ROW BEGIN {body} END
+            """)
+        connection.commit()
+
+        copied = 0
+        last_key = None
+        while True:
+            lower_sql, lower_params = "", ()
+            if last_key is not None:
+                lower_sql, lower_params = " WHERE user_id > %s", (last_key,)
+            cursor.execute(
+                f"SELECT user_id FROM user_data{lower_sql} "
+                "ORDER BY user_id LIMIT 1 OFFSET %s",
+                (*lower_params, chunk_size - 1)
+            )
+            row = cursor.fetchone()
+            upper_key = row[0] if row else None
+
+            conditions, params = [], list(lower_params)
+            if last_key is not None:
+                conditions.append("user_id > %s")
+            if upper_key is not None:
+                conditions.append("user_id <= %s")
+                params.append(upper_key)
+            where_sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+            # IGNORE keeps rows the triggers already wrote (they are newer)
+            cursor.execute(
+                "INSERT IGNORE INTO user_data_v2 (user_id, name, email, age) "
+                f"SELECT UUID_TO_BIN(user_id), name, email, age FROM user_data{where_sql}",
+                params
+            )
+            connection.commit()
+            copied += cursor.rowcount
+            if upper_key is None:
+                break
+            last_key = upper_key
+
+        cursor.execute("RENAME TABLE user_data TO user_data_v1, user_data_v2 TO user_data")
+        swapped = True
+        for op in ('insert', 'update', 'delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS user_data_migrate_{op}")
+        connection.commit()
+
+        # Change-log triggers stayed on the old table; attach them to the new one
+        cursor.execute("SHOW TABLES LIKE 'user_data_changes'")
+        if cursor.fetchone():
+            create_change_log(connection, version=2)
+    except Exception:
+        connection.rollback()
+        # Stop mirroring writes, otherwise every later write to user_data
+        # still goes to (or fails on) the shadow table
+        for op in ('insert', 'update', 'delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS user_data_migrate_{op}")
+        if not swapped:
+            cursor.execute("DROP TABLE IF EXISTS user_data_v2")
+        connection.commit()
+        raise
+    finally:
+        cursor.close()
+
+    print(f"Migrated {copied} rows to schema 2; set MY_DB_SCHEMA=2")
+    return copied
+
+def create_change_log(connection, version=None):
+    """
+    Create the user_data_changes table and the triggers that append one
+    row to it for every insert, update and delete on user_data
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_data_changes (
+            change_id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            op ENUM('insert', 'update', 'delete') NOT NULL,
+            user_id CHAR(36) NOT NULL,
+            changed_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        )
     """)
+    for op, event, row in (('insert', 'INSERT', 'NEW'),
+                           ('update', 'UPDATE', 'NEW'),
+                           ('delete', 'DELETE', 'OLD')):
+        cursor.execute(f"DROP TRIGGER IF EXISTS user_data_after_{op}")
+        cursor.execute(f"""
+            CREATE TRIGGER user_data_after_{op} AFTER {event} ON user_data
+            FOR EACH ROW
+            INSERT INTO user_data_changes (op, user_id)
+            VALUES ('{op}', {query.key_to_text(f"{row}.user_id", version)})
+        """)
     connection.commit()
     cursor.close()
 
-def insert_data(connection, csv_file):
-    """Insert data from CSV into table"""
+USER_ID_NAMESPACE = uuid.NAMESPACE_URL
+
+def user_id_for(email):
+    """Deterministic user_id (uuid5) derived from the user's email"""
+    return str(uuid.uuid5(USER_ID_NAMESPACE, f"mailto:{email.lower()}"))
+
+def user_id_sql(email_expr):
+    """SQL expression computing the same uuid5 as user_id_for in MySQL"""
+    digest = (f"SHA1(CONCAT(UNHEX('{USER_ID_NAMESPACE.hex}'), "
+              f"'mailto:', LOWER({email_expr})))")
+    return (f"LOWER(CONCAT(SUBSTR({digest}, 1, 8), '-', SUBSTR({digest}, 9, 4), "
+            f"'-5', SUBSTR({digest}, 14, 3), '-', "
+            f"HEX((CONV(SUBSTR({digest}, 17, 1), 16, 10) & 3) | 8), "
+            f"SUBSTR({digest}, 18, 3), '-', SUBSTR({digest}, 21, 12)))")
+
+def read_checkpoint(checkpoint_file):
+    """Return the position saved in checkpoint_file, or None"""
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file) as file:
+        return int(file.read().strip() or 0)
+
+def write_checkpoint(checkpoint_file, position):
+    """Atomically record position (e.g. the number of committed rows)"""
+    if not checkpoint_file:
+        return
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, 'w') as file:
+        file.write(str(position))
+    os.replace(tmp_file, checkpoint_file)
+
+def read_csv_rows(csv_file, skip=0):
+    """
+    Yield each CSV row after the header, skipping the first skip rows.
+    One streaming csv.reader parses the file, so quoted fields may hold
+    newlines; blank lines are not rows.
+    """
+    with open(csv_file, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header
+        rows = (row for row in reader if row)
+        yield from itertools.islice(rows, skip, None)
+
+def report_progress(rows, started):
+    """Print how many rows have been loaded and the load rate"""
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else 0
+    print(f"Inserted {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/sec)")
+
+def load_data_infile(connection, csv_file):
+    """
+    Bulk load the CSV with LOAD DATA LOCAL INFILE.
+    The connection must be opened with allow_local_infile=True.
+    Existing users are replaced, so re-running the load is safe.
+    """
     cursor = connection.cursor()
-    sql = "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)"
+    started = time.perf_counter()
     try:
-        with open(csv_file, 'r') as file:
-            next(file)  # Skip header
-            for line in file:
-                name, email, age = line.strip().split(',')
-                uid = str(uuid.uuid4())
-                cursor.execute(sql, (uid, name, email, age))
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE user_data
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 LINES
+            (name, @email, age)
+            SET email = @email, user_id = {query.key_from_text(user_id_sql('@email'))}
+        """, (os.path.abspath(csv_file),))
+        connection.commit()
+        report_progress(cursor.rowcount, started)
+        return cursor.rowcount
+    except mysql.connector.Error as e:
+        connection.rollback()
+        print(f"Error loading data: {e}")
+        return 0
+    finally:
+        cursor.close()
+
+def insert_data(connection, csv_file, chunk_size=5000, load_data=False,
+                report_every=100000, checkpoint_file=None):
+    """
+    Insert data from CSV into table.
+    Each chunk of chunk_size rows is sent with executemany (rewritten by
+    the connector into multi-row INSERTs) into a temporary staging table,
+    then moved into user_data with one INSERT ... SELECT that computes
+    user_id from the email in SQL (user_id_sql), and committed.
+    Existing rows are updated, so the load is idempotent. With
+    checkpoint_file the number of committed rows is saved after every
+    chunk and an interrupted load resumes after them; the file is
+    removed once the load completes.
+    load_data=True uses the LOAD DATA LOCAL INFILE fast path instead.
+    Returns the number of rows inserted.
+    """
+    if load_data:
+        return load_data_infile(connection, csv_file)
+
+    cursor = connection.cursor()
+    stage_sql = "INSERT INTO user_data_load (name, email, age) VALUES (%s, %s, %s)"
+    move_sql = ("INSERT INTO user_data (user_id, name, email, age) "
+                f"SELECT {query.key_from_text(user_id_sql('email'))}, name, email, age "
+                "FROM user_data_load WHERE 1 "
+                "ON DUPLICATE KEY UPDATE name = VALUES(name), email = VALUES(email), "
+                "age = VALUES(age)")
+    started = time.perf_counter()
+    total = 0
+    reported = 0
+
+    def write_chunk(chunk):
+        cursor.executemany(stage_sql, chunk)
+        cursor.execute(move_sql)
+        cursor.execute("DELETE FROM user_data_load")
         connection.commit()
+
+    try:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS user_data_load "
+            "(name VARCHAR(255), email VARCHAR(255), age VARCHAR(32))"
+        )
+        cursor.execute("DELETE FROM user_data_load")
+        done = read_checkpoint(checkpoint_file) or 0
+        if done:
+            print(f"Resuming {csv_file} after row {done}")
+        chunk = []
+        for row in read_csv_rows(csv_file, done):
+            chunk.append(row)
+            if len(chunk) < chunk_size:
+                continue
+            write_chunk(chunk)
+            total += len(chunk)
+            write_checkpoint(checkpoint_file, done + total)
+            chunk = []
+            if report_every and total - reported >= report_every:
+                report_progress(total, started)
+                reported = total
+        if chunk:
+            write_chunk(chunk)
+            total += len(chunk)
+        if checkpoint_file and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        report_progress(total, started)
     except FileNotFoundError:
         print(f"Error: {csv_file} not found.")
     except Exception as e:
+        connection.rollback()
         print(f"Error inserting data: {e}")
     finally:
         cursor.close()
+    return total
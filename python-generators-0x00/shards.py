@@ -0,0 +1,166 @@
+"""Fan-out streaming of user_data spread over several MySQL shards"""
+import os
+import json
+import heapq
+import queue
+import operator
+import threading
+import mysql.connector
+pool = __import__('pool')
+query = __import__('query')
+rows = __import__('rows')
+
+def load_shard_map(path=None):
+    """
+    Read the shard map: a JSON file (path, or MY_DB_SHARDS) like
+    {"shards": [{"name": "eu", "host": "...", "database": "ALX_prodev"}, ...]}.
+    Missing user/password/host/database fall back to the MY_DB_* variables.
+    Without a shard map the single MY_DB_HOST database is the only shard.
+    """
+    path = path or os.environ.get("MY_DB_SHARDS")
+    shards = [{}]
+    if path:
+        with open(path) as file:
+            shards = json.load(file)['shards']
+
+    shard_map = []
+    for i, shard in enumerate(shards):
+        config = {
+            "host": os.environ.get("MY_DB_HOST", "localhost"),
+            "user": os.environ.get("MY_DB_USER", "root"),
+            "password": os.environ.get("MY_DB_PASSWORD", ""),
+            "database": "ALX_prodev",
+        }
+        config.update(shard)
+        config.setdefault("name", f"shard{i}")
+        shard_map.append(config)
+    return shard_map
+
+def shard_pool(shard):
+    """The shared connection pool of one shard"""
+    config = {key: value for key, value in shard.items() if key != 'name'}
+    return pool.get_pool(
+        f"shard:{shard['name']}", connect=lambda: mysql.connector.connect(**config)
+    )
+
+def shard_batches(shard, batch_size, where=None, columns=None, ordered=False,
+                  as_rows=False):
+    """Generator of batches streamed from one shard"""
+    sql, params, names = query.build_select(columns, where)
+    if ordered:
+        sql += query.ORDER_BY_KEY
+    make_row = rows.row_factory(names, as_rows)
+    with shard_pool(shard).connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql, params)
+            for fetched in iter(lambda: cursor.fetchmany(batch_size), []):
+                yield [make_row(row) for row in fetched]
+        finally:
+            pool.close_cursor(conn, cursor)
+
+
+class _ShardReader(threading.Thread):
+    """Streams one shard into a queue, at most queue_size batches ahead"""
+
+    def __init__(self, index, batches, out_queue, queue_size, stop):
+        super().__init__(daemon=True)
+        self.index = index
+        self.batches = batches
+        self.out_queue = out_queue
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.stop = stop
+
+    def send(self, kind, item):
+        while not self.stop.is_set():
+            if self.slots.acquire(timeout=0.1):
+                self.out_queue.put((self.index, kind, item))
+                return True
+        return False
+
+    def run(self):
+        try:
+            for batch in self.batches:
+                if not self.send('batch', batch):
+                    return
+            self.send('done', None)
+        except Exception as e:
+            self.send('error', e)
+        finally:
+            self.batches.close()
+
+
+def stream_users_in_batches_sharded(batch_size, where=None, columns=None,
+                                    ordered=False, as_rows=False,
+                                    shard_map=None, queue_size=4):
+    """
+    Generator that queries every shard concurrently and merges the batches.
+    Each shard may run at most queue_size batches ahead of the consumer.
+    Unordered mode yields batches as they arrive; ordered mode k-way
+    merges the shards by user_id and yields batches of up to batch_size.
+    """
+    if ordered and 'user_id' not in query.compile_columns(columns):
+        raise ValueError("ordered mode needs user_id in the selected columns")
+    shard_map = shard_map or load_shard_map()
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue() for _ in shard_map]
+    else:
+        queues = [queue.Queue()] * len(shard_map)
+    readers = [
+        _ShardReader(
+            i, shard_batches(shard, batch_size, where, columns, ordered, as_rows),
+            queues[i], queue_size, stop
+        )
+        for i, shard in enumerate(shard_map)
+    ]
+    for reader in readers:
+        reader.start()
+
+    def receive(out_queue):
+        index, kind, item = out_queue.get()
+        readers[index].slots.release()
+        if kind == 'error':
+            raise item
+        return index, kind, item
+
+    def shard_rows(index):
+        while True:
+            _, kind, batch = receive(queues[index])
+            if kind == 'done':
+                return
+            yield from batch
+
+    try:
+        if ordered:
+            if as_rows:
+                key = operator.attrgetter('user_id')
+            else:
+                key = operator.itemgetter('user_id')
+            merged = heapq.merge(*[shard_rows(i) for i in range(len(readers))], key=key)
+            batch = []
+            for row in merged:
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        else:
+            remaining = len(readers)
+            while remaining:
+                _, kind, batch = receive(queues[0])
+                if kind == 'done':
+                    remaining -= 1
+                else:
+                    yield batch
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+def stream_users_sharded(ordered=False, batch_size=1000, shard_map=None):
+    """stream_users over every shard: yields UserRow rows one by one"""
+    for batch in stream_users_in_batches_sharded(
+            batch_size, ordered=ordered, as_rows=True, shard_map=shard_map):
+        yield from batch
@@ -0,0 +1,115 @@
+"""SQLite stand-in for the parts of mysql.connector used by this project"""
+import re
+import sqlite3
+import hashlib
+
+Error = sqlite3.Error
+
+def translate(sql):
+    """Rewrite the MySQL dialect used by the readers and seed.py for SQLite"""
+    sql = sql.replace("%s", "?")
+    sql = sql.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET")
+    sql = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", sql)
+    sql = re.sub(r"\bDIV\b", "/", sql)
+    return sql
+
+
+class StandinCursor:
+    """mysql.connector-style cursor (dictionary=True supported) over sqlite3"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate(sql), tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        self._cursor.executemany(translate(sql), (tuple(p) for p in seq_params))
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._convert(row) for row in self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+def _concat(*values):
+    if any(isinstance(value, bytes) for value in values):
+        return b"".join(value if isinstance(value, bytes) else str(value).encode()
+                        for value in values)
+    return "".join(str(value) for value in values)
+
+def _hex(value):
+    if isinstance(value, int):
+        return format(value, 'X')
+    if isinstance(value, str):
+        value = value.encode()
+    return value.hex().upper()
+
+# MySQL functions used by seed.user_id_sql that SQLite lacks (or, for HEX
+# of an integer, computes differently)
+MYSQL_FUNCTIONS = {
+    'SHA1': (1, lambda value: hashlib.sha1(
+        value if isinstance(value, bytes) else str(value).encode()).hexdigest()),
+    'UNHEX': (1, bytes.fromhex),
+    'CONCAT': (-1, _concat),
+    'HEX': (1, _hex),
+    'CONV': (3, lambda value, from_base, to_base: int(str(value), from_base)),
+}
+
+
+class StandinConnection:
+    """mysql.connector-style connection over a SQLite database file"""
+
+    unread_result = False
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        for name, (arity, function) in MYSQL_FUNCTIONS.items():
+            self._conn.create_function(name, arity, function, deterministic=True)
+
+    def cursor(self, buffered=None, dictionary=False):
+        return StandinCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        try:
+            self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._conn.close()
+
+def connect(path):
+    """Open a stand-in connection to the SQLite file at path"""
+    return StandinConnection(path)